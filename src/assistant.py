@@ -14,6 +14,7 @@ The assistant can:
 """
 from html import parser
 import os
+import asyncio
 from colorama import Fore, Style
 import argparse
 
@@ -21,7 +22,25 @@ import argparse
 from gemini.client import GeminiClient, load_system_prompt
 from core.history_manager import load_history, clear_history
 from core.image_handler import ImageHandler
-from core.message_processor import process_user_input
+from core.message_processor import process_user_input, process_user_input_async, ConversationSession
+
+def handle_builtin_command(user_input):
+    """Handles commands that never reach the AI.
+    Returns 'exit', 'clear history', 'handled' or None for normal input."""
+    if user_input.lower() == 'exit':
+        print(Fore.RED + "Goodbye!" + Style.RESET_ALL)
+        return 'exit'
+    elif user_input.lower() == 'clear':
+        os.system('cls' if os.name == 'nt' else 'clear')
+        print(Fore.YELLOW + "Cleared the screen." + Style.RESET_ALL)
+        return 'handled'
+    elif user_input.lower() == 'clear history':
+        return 'clear history'
+    elif user_input.strip() == '':
+        print(Fore.RED + "Please enter a command." + Style.RESET_ALL)
+        return 'handled'
+    return None
+
 
 def main():
     """Main loop for the assistant."""
@@ -35,25 +54,46 @@ def main():
    
     # Load conversation history
     history = load_history()
+    session = ConversationSession()
 
     while True:
         user_input = input(Fore.YELLOW + 'Command: ' + Style.RESET_ALL)
-        if user_input.lower() == 'exit':
-            print(Fore.RED + "Goodbye!" + Style.RESET_ALL)
+        command = handle_builtin_command(user_input)
+        if command == 'exit':
             break
-        elif user_input.lower() == 'clear':
-            os.system('cls' if os.name == 'nt' else 'clear')
-            print(Fore.YELLOW + "Cleared the screen." + Style.RESET_ALL)
-            continue
-        elif user_input.lower() == 'clear history':
+        elif command == 'clear history':
             history = clear_history()
             continue
-        elif user_input.strip() == '':
-            print(Fore.RED + "Please enter a command." + Style.RESET_ALL)
+        elif command == 'handled':
             continue
         
         # Process user input using the message processor
-        history = process_user_input(user_input, history, gemini_client, config, image_handler)
+        history = process_user_input(user_input, history, gemini_client, config, image_handler, session)
+
+
+async def main_async():
+    """asyncio main loop: model calls and tool I/O run without blocking the event loop."""
+    gemini_client = GeminiClient()
+    image_handler = ImageHandler()
+    
+    system_prompt = load_system_prompt()
+    config = gemini_client.get_content_config(system_prompt)
+    
+    history = load_history()
+    session = ConversationSession()
+
+    while True:
+        user_input = await asyncio.to_thread(input, Fore.YELLOW + 'Command: ' + Style.RESET_ALL)
+        command = handle_builtin_command(user_input)
+        if command == 'exit':
+            break
+        elif command == 'clear history':
+            history = clear_history()
+            continue
+        elif command == 'handled':
+            continue
+        
+        history = await process_user_input_async(user_input, history, gemini_client, config, image_handler, session)
 
 
 def get_landing_text():
@@ -78,12 +118,16 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser()
         parser.add_argument('--no-ascii', action='store_true', help='Disable ASCII art in the terminal')
+        parser.add_argument('--async', dest='use_async', action='store_true', help='Run the asyncio pipeline')
         args = parser.parse_args()
         if not args.no_ascii:
             print(get_landing_text())
         else :
             print(Fore.MAGENTA + Style.BRIGHT + "AI Assistant ✨" + Style.RESET_ALL)
-        main()
+        if args.use_async:
+            asyncio.run(main_async())
+        else:
+            main()
     except KeyboardInterrupt:
         print(Fore.RED + "\nProgram interrupted." + Style.RESET_ALL)
         exit(0)
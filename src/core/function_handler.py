@@ -1,22 +1,43 @@
 """
 Function call handling and module loading.
 Manages the execution of function calls from the AI by loading appropriate modules.
+
+Calls from one model turn can run concurrently on a small thread pool. A module
+opts out by defining SEQUENTIAL_ACTIONS: a set of (lowercase) actions whose
+side effects must stay ordered, or True to keep every call to it sequential.
+
+For the asyncio pipeline a module may also define `async def execute_async(args)`;
+modules without it are run on a worker thread through their sync `execute`.
 """
+import asyncio
 import importlib
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from colorama import Fore, Style
 from utils.memory import save_to_memory
 from .history_manager import add_to_history
 
 
-def load_module(module_name):
-    """Dynamically loads a module from the 'modules' package."""
+MAX_PARALLEL_CALLS = 4
+
+_executor = None
+
+
+def find_module(module_name):
+    """Imports a module from the 'modules' package, or returns None without reporting it."""
     try:
         return importlib.import_module(f'modules.{module_name}')
     except ModuleNotFoundError:
-        print(f"Module {module_name} not found!")
         return None
 
 
+def load_module(module_name):
+    """Dynamically loads a module from the 'modules' package."""
+    module = find_module(module_name)
+    if module is None:
+        print(f"Module {module_name} not found!")
+    return module
+
+
 def handle_memory_function(function_args):
     """Handles memory function calls: save or retrieve information."""
     topic = function_args.get("topic")
@@ -28,23 +49,136 @@ def handle_memory_function(function_args):
         print("Invalid memory function call.")
 
 
-def handle_function_call(function_name, function_args, history):
-    """Handles dynamic function calls by loading and executing the appropriate module.
-    Adds the function response to history so the AI remembers."""
+def get_executor():
+    """Returns the shared thread pool used for concurrent function calls."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_CALLS, thread_name_prefix="function-call")
+    return _executor
+
+
+def is_parallel_safe(function_name, function_args):
+    """Whether a call may run concurrently with the other calls of its turn."""
+    if function_name == "memory":
+        return False
+    # Unknown modules are reported once, when the call is dispatched
+    module = find_module(function_name)
+    if module is None:
+        return False
+    sequential_actions = getattr(module, 'SEQUENTIAL_ACTIONS', set())
+    if sequential_actions is True:
+        return False
+    action = str((function_args or {}).get("action", "")).lower()
+    return action not in sequential_actions
+
+
+def run_function(function_name, function_args):
+    """Executes a function call and returns its result, or None if there is none.
+    Does not touch history, so it is safe to call from worker threads."""
     if function_name == "memory":
         handle_memory_function(function_args)
-        return history
+        return None
 
     module = load_module(function_name)
     if module and hasattr(module, 'execute'):
         res = module.execute(function_args)
         if res is None:
             print(Fore.RED + "No response from the function." + Style.RESET_ALL)
-            return history
-        print(Style.DIM + Fore.WHITE + str(res) + Style.RESET_ALL)
-        # Add function response to history as assistant message
-        history = add_to_history(history, "user", str(res))
+        return res
+    print(Fore.RED + f"No executable module found for '{function_name}'." + Style.RESET_ALL)
+    return None
+
+
+def record_function_result(history, res):
+    """Prints a function result and adds it to history so the AI remembers."""
+    if res is None:
         return history
-    else:
-        print(Fore.RED + f"No executable module found for '{function_name}'." + Style.RESET_ALL)
-        return history
\ No newline at end of file
+    print(Style.DIM + Fore.WHITE + str(res) + Style.RESET_ALL)
+    # Add function response to history as assistant message
+    return add_to_history(history, "user", str(res))
+
+
+def handle_function_call(function_name, function_args, history):
+    """Handles dynamic function calls by loading and executing the appropriate module.
+    Adds the function response to history so the AI remembers."""
+    return record_function_result(history, run_function(function_name, function_args))
+
+
+class FunctionCallDispatcher:
+    """Runs the function calls of one model turn, concurrently where it is safe.
+
+    Calls start as soon as they are submitted and results are returned in the
+    order the model asked for them. A sequential call waits for every earlier
+    call to finish and completes before any later call starts.
+    """
+
+    def __init__(self):
+        self.calls = []  # (function_name, function_args, future) in request order
+
+    def submit(self, function_name, function_args):
+        """Start a function call."""
+        if is_parallel_safe(function_name, function_args):
+            future = get_executor().submit(run_function, function_name, function_args)
+        else:
+            wait([call[2] for call in self.calls])
+            future = Future()
+            try:
+                future.set_result(run_function(function_name, function_args))
+            except Exception as e:
+                future.set_exception(e)
+        self.calls.append((function_name, function_args, future))
+
+    def results(self):
+        """Yields (function_name, function_args, result) in request order."""
+        for function_name, function_args, future in self.calls:
+            yield function_name, function_args, future.result()
+
+
+async def run_function_async(function_name, function_args):
+    """Async variant of run_function.
+
+    Uses the module's execute_async coroutine when it has one, otherwise runs
+    the sync execute on a worker thread so the event loop stays free.
+    """
+    if function_name != "memory":
+        module = load_module(function_name)
+        if module is None:
+            print(Fore.RED + f"No executable module found for '{function_name}'." + Style.RESET_ALL)
+            return None
+        if hasattr(module, 'execute_async'):
+            res = await module.execute_async(function_args)
+            if res is None:
+                print(Fore.RED + "No response from the function." + Style.RESET_ALL)
+            return res
+    return await asyncio.to_thread(run_function, function_name, function_args)
+
+
+class AsyncFunctionCallDispatcher:
+    """asyncio counterpart of FunctionCallDispatcher with the same ordering rules."""
+
+    def __init__(self):
+        self.calls = []  # (function_name, function_args, task) in request order
+        self._slots = asyncio.Semaphore(MAX_PARALLEL_CALLS)
+
+    async def _run_limited(self, function_name, function_args):
+        async with self._slots:
+            return await run_function_async(function_name, function_args)
+
+    async def submit(self, function_name, function_args):
+        """Start a function call; sequential calls are awaited before returning."""
+        if is_parallel_safe(function_name, function_args):
+            task = asyncio.create_task(self._run_limited(function_name, function_args))
+        else:
+            earlier = [call[2] for call in self.calls]
+            if earlier:
+                await asyncio.wait(earlier)
+            task = asyncio.get_running_loop().create_future()
+            try:
+                task.set_result(await run_function_async(function_name, function_args))
+            except Exception as e:
+                task.set_exception(e)
+        self.calls.append((function_name, function_args, task))
+
+    async def results(self):
+        """Returns [(function_name, function_args, result)] in request order."""
+        return [(function_name, function_args, await task) for function_name, function_args, task in self.calls]
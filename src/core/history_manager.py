@@ -1,54 +1,162 @@
 """
 Conversation history management.
 Handles loading, saving, and managing conversation history with the AI.
+
+History is stored as an append-only JSON Lines log: every message is appended
+as a single record, the log is compacted down to the last MAX_HISTORY records
+in a background thread once it grows past COMPACT_THRESHOLD records, and
+startup only parses the tail of the file.
 """
 import os
 import json
+import threading
 
 
 # History configuration
-HISTORY_FILE = "src/utils/history.json"
+HISTORY_FILE = "src/utils/history.jsonl"
+LEGACY_HISTORY_FILE = "src/utils/history.json"
+MEMORY_FILE = "src/utils/memory.json"
 MAX_HISTORY = 100
+COMPACT_THRESHOLD = MAX_HISTORY * 3  # Records in the log before it is compacted
+TAIL_READ_BLOCK = 64 * 1024  # Bytes read per step when scanning the log backwards
+
+_log_lock = threading.Lock()
+_records_in_log = None  # Lazily counted on first append
+_compaction_thread = None
+
+
+def _read_tail_lines(path, max_lines):
+    """Read the last max_lines lines of a file without reading the whole file."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= max_lines:
+            step = min(TAIL_READ_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    return [line for line in data.splitlines() if line.strip()][-max_lines:]
+
+
+def _parse_records(lines):
+    """Parse JSONL lines into history messages, skipping corrupt or partial lines."""
+    history = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if isinstance(record, dict) and "role" in record and "content" in record:
+            history.append(record)
+    return history
+
+
+def _migrate_legacy_history():
+    """Convert the old history.json snapshot into the JSONL log, once."""
+    if os.path.exists(HISTORY_FILE) or not os.path.exists(LEGACY_HISTORY_FILE):
+        return
+    try:
+        with open(LEGACY_HISTORY_FILE, "r", encoding="utf-8") as f:
+            history = json.load(f)
+    except Exception:
+        return
+    save_history(history)
+    os.remove(LEGACY_HISTORY_FILE)
 
 
 def load_history():
-    """Load conversation history from a JSON file."""
+    """Load the last MAX_HISTORY messages from the history log."""
+    _migrate_legacy_history()
     if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except Exception:
-                return []
+        try:
+            return _parse_records(_read_tail_lines(HISTORY_FILE, MAX_HISTORY))
+        except OSError:
+            return []
     return []
 
 
+def _rewrite_log(records):
+    """Atomically replace the log with the given records. Caller holds _log_lock."""
+    global _records_in_log
+    temp_file = HISTORY_FILE + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(temp_file, HISTORY_FILE)
+    _records_in_log = len(records)
+
+
 def save_history(history):
-    """Save conversation history to a JSON file."""
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(history[-MAX_HISTORY:], f, ensure_ascii=False, indent=2)
+    """Rewrite the history log so it only holds the last MAX_HISTORY messages."""
+    with _log_lock:
+        _rewrite_log(history[-MAX_HISTORY:])
+
+
+def _append_record(record):
+    """Append a single message record to the history log."""
+    global _records_in_log
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _log_lock:
+        if _records_in_log is None:
+            _records_in_log = _count_records()
+        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+            f.write(line)
+        _records_in_log += 1
+        return _records_in_log
+
+
+def _count_records():
+    """Count the records currently in the history log."""
+    if not os.path.exists(HISTORY_FILE):
+        return 0
+    with open(HISTORY_FILE, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def _compact_history():
+    """Rewrite the log to its last MAX_HISTORY records."""
+    try:
+        with _log_lock:
+            _rewrite_log(_parse_records(_read_tail_lines(HISTORY_FILE, MAX_HISTORY)))
+    except Exception as e:
+        print(f"Warning: Could not compact history: {e}")
+
+
+def _schedule_compaction():
+    """Start a background compaction unless one is already running."""
+    global _compaction_thread
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return
+    _compaction_thread = threading.Thread(target=_compact_history, daemon=True)
+    _compaction_thread.start()
 
 
 def add_to_history(history, role, content):
     """Add a message to the history and trim to the last MAX_HISTORY messages."""
-    history.append({"role": role, "content": content})
+    record = {"role": role, "content": content}
+    history.append(record)
     if len(history) > MAX_HISTORY:
         history = history[-MAX_HISTORY:]
-    save_history(history)
+    if _append_record(record) > COMPACT_THRESHOLD:
+        _schedule_compaction()
     return history
 
 
 def clear_history():
     """Clear the conversation history (both in memory and on disk)."""
-    if os.path.exists(HISTORY_FILE):
-        os.remove(HISTORY_FILE)
+    global _records_in_log
+    with _log_lock:
+        for path in (HISTORY_FILE, LEGACY_HISTORY_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        _records_in_log = 0
     print("Conversation history cleared.")
     return []
 
 
 def load_memory_content():
     """Load memory.json as a string for context injection."""
-    MEMORY_FILE = "src/utils/memory.json"
-    
     if os.path.exists(MEMORY_FILE):
         with open(MEMORY_FILE, "r", encoding="utf-8") as f:
             try:
@@ -56,4 +164,4 @@ def load_memory_content():
                 return json.dumps(memory, ensure_ascii=False, indent=2)
             except Exception:
                 return ""
-    return ""
\ No newline at end of file
+    return ""
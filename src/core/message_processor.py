@@ -3,12 +3,23 @@ Message processing for Gemini API interactions.
 Handles building messages, processing responses, and managing the conversation flow.
 """
 import os
+import asyncio
 from google.genai import types
 from PIL import Image
 from colorama import Fore, Style
-from .history_manager import add_to_history, load_memory_content
-from .function_handler import handle_function_call
-from utils.bubble_manager import get_bubble_context, increment_message_count
+from .history_manager import add_to_history, load_memory_content, MEMORY_FILE
+from .function_handler import FunctionCallDispatcher, AsyncFunctionCallDispatcher, record_function_result
+from utils.bubble_manager import get_bubble_context, get_bubble_version, increment_message_count
+
+
+MODEL_NAME = "gemini-2.5-flash"
+STREAM_RESPONSES = os.getenv('GEMINI_STREAM', '1') == '1'
+
+
+def history_to_content(msg):
+    """Convert a single history message to a Gemini Content object."""
+    role = "user" if msg["role"] == "user" else "model"
+    return types.Content(role=role, parts=[types.Part(text=msg["content"])])
 
 
 def build_gemini_messages(history):
@@ -27,141 +38,390 @@ def build_gemini_messages(history):
     
     # Add conversation history
     for msg in history:
-        if msg["role"] == "user":
-            messages.append(types.Content(role="user", parts=[types.Part(text=msg["content"])]))
-        else:
-            messages.append(types.Content(role="model", parts=[types.Part(text=msg["content"])]))
+        messages.append(history_to_content(msg))
     return messages
 
 
+class ConversationSession:
+    """Keeps the Gemini Content list for a conversation alive between model calls.
+
+    History messages are converted once and cached; on each call only messages
+    appended since the last call are converted. The memory/bubble prefix is
+    rebuilt only when memory.json or the bubble store has changed.
+    """
+
+    def __init__(self):
+        self._source = []      # History dicts that have been converted, in order
+        self._contents = []    # Content objects matching self._source
+        self._memory_prefix = []
+        self._bubble_prefix = []
+        self._prefix_key = None
+
+    def _memory_stamp(self):
+        """Cheap change detector for memory.json (one stat call)."""
+        try:
+            stat = os.stat(MEMORY_FILE)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _refresh_prefix(self):
+        """Rebuild the memory and bubble context messages if their stores changed."""
+        key = (self._memory_stamp(), get_bubble_version())
+        if key == self._prefix_key:
+            return
+        if self._prefix_key is None or key[0] != self._prefix_key[0]:
+            self._memory_prefix = []
+            memory_context = load_memory_content()
+            if memory_context.strip():
+                self._memory_prefix.append(types.Content(role="user", parts=[types.Part(text=f"Here is my memory context, remember this about me and use it for all future responses:\n{memory_context}")]))
+        self._bubble_prefix = []
+        bubble_context = get_bubble_context()
+        if bubble_context.strip():
+            self._bubble_prefix.append(types.Content(role="user", parts=[types.Part(text=bubble_context)]))
+        # Bubble cleanup may have saved the store, so read the version afterwards
+        self._prefix_key = (key[0], get_bubble_version())
+
+    def _sync_history(self, history):
+        """Convert only the history messages added since the last sync."""
+        if self._source and history and history[0] is not self._source[0]:
+            # History was trimmed from the front; drop the same messages here
+            try:
+                start = next(i for i, msg in enumerate(self._source) if msg is history[0])
+            except StopIteration:
+                start = None
+            if start is None:
+                self.reset()
+            else:
+                del self._source[:start]
+                del self._contents[:start]
+
+        synced = len(self._source)
+        if synced > len(history) or (synced and history[synced - 1] is not self._source[-1]):
+            # History was replaced (e.g. cleared); start over
+            self.reset()
+            synced = 0
+
+        for msg in history[synced:]:
+            self._source.append(msg)
+            self._contents.append(history_to_content(msg))
+
+    def memory_messages(self):
+        """Return the memory context messages (the cacheable part of the prefix)."""
+        self._refresh_prefix()
+        return self._memory_prefix
+
+    def build_messages(self, history, include_memory=True):
+        """Return the Gemini message list for the given history.
+
+        Pass include_memory=False when the memory messages are already part
+        of a context cache referenced by the request config.
+        """
+        self._refresh_prefix()
+        self._sync_history(history)
+        memory_prefix = self._memory_prefix if include_memory else []
+        return memory_prefix + self._bubble_prefix + self._contents
+
+    def reset(self):
+        """Drop all cached history contents."""
+        self._source = []
+        self._contents = []
+
+
+def prepare_request(session, history, gemini_client, config):
+    """Returns the (config, messages) pair for the next model call.
+
+    When context caching is enabled the memory messages travel inside the
+    cache, so they are left out of the inline messages.
+    """
+    cached_config = gemini_client.get_cached_config(MODEL_NAME, config, session.memory_messages())
+    if cached_config is not None:
+        return cached_config, session.build_messages(history, include_memory=False)
+    return config, session.build_messages(history)
+
+
 def print_ai_response(response):
     """Prints the AI's text response."""
     print(Style.BRIGHT + Fore.WHITE + response + Style.RESET_ALL)
 
 
-def process_user_input(user_input, history, gemini_client, config, image_handler):
-    """Processes user input, sends it to Gemini, handles function calls, and lets the AI answer after function calls."""
+def iter_response_parts(gemini_client, config, messages, stream):
+    """Yields the parts of the model's response.
+
+    With stream=True parts are yielded as soon as their chunk arrives, so
+    function calls are dispatched before generation finishes.
+    """
+    if stream:
+        responses = gemini_client.generate_content_stream(
+            model_name=MODEL_NAME,
+            config=config,
+            contents=messages
+        )
+    else:
+        responses = [gemini_client.generate_content(
+            model_name=MODEL_NAME,
+            config=config,
+            contents=messages
+        )]
+    for response in responses:
+        if not response.candidates or not response.candidates[0].content:
+            continue
+        for part in response.candidates[0].content.parts or []:
+            yield part
+
+
+def run_model_turn(gemini_client, config, messages, history, stream):
+    """Runs one model call, dispatching function calls as their parts arrive.
+
+    Independent calls run concurrently; their results are added to history in
+    the order the model requested them. Text is only collected, since it is
+    not shown when the turn calls functions (it might be hallucinated).
+    If the model call fails midway, the results of the calls it already
+    dispatched are still added to history, because they ran.
+    Returns (text_content, function_call_count, history, error), where error
+    is the exception that ended a failed call, or None.
+    """
+    text_content = ""
+    dispatcher = FunctionCallDispatcher()
+    error = None
+
+    try:
+        for part in iter_response_parts(gemini_client, config, messages, stream):
+            if getattr(part, "thought", False):
+                continue
+            if hasattr(part, "function_call") and part.function_call:
+                function_name = part.function_call.name
+                function_args = part.function_call.args
+                print(Fore.LIGHTRED_EX + f"Function call detected: {function_name} with arguments {function_args}" + Style.RESET_ALL + "\n---------------------------------------------------------------")
+                dispatcher.submit(function_name, function_args)
+            elif hasattr(part, "text") and part.text:
+                text_content += part.text
+    except Exception as e:
+        error = e
+
+    history = record_function_results(history, dispatcher.results())
+    return text_content, len(dispatcher.calls), history, error
+
+
+def record_function_results(history, results):
+    """Adds (function_name, function_args, result) tuples to history in order."""
+    for function_name, function_args, res in results:
+        history = record_function_result(history, res)
+        function_result = str(res) if res is not None else ""
+
+        # Add a message to history indicating the function was executed with its result
+        # This helps Gemini understand that the function was called and what the result was
+        function_execution_msg = f"Function '{function_name}' was executed with arguments {function_args}. Result: {function_result}"
+        history = add_to_history(history, "user", function_execution_msg)
+    return history
+
+
+def describe_error(e):
+    """Returns a readable description of an unexpected exception."""
+    try:
+        # Try to get error message safely
+        if hasattr(e, 'message'):
+            return e.message
+        elif hasattr(e, 'args') and e.args:
+            return str(e.args[0])
+        return type(e).__name__
+    except Exception:
+        return type(e).__name__
+
+
+def record_model_error(history, e, first_turn):
+    """Reports a failed model call and adds a fallback reply to history."""
     from google.genai.errors import APIError
+
+    if isinstance(e, APIError):
+        if first_turn:
+            error_msg = f"🚫 API Error: {str(e)}"
+            print(Fore.RED + error_msg + Style.RESET_ALL)
+            return add_to_history(history, "assistant", "I'm sorry, but I'm having trouble connecting to my AI service right now. Please try your request again in a moment.")
+        error_msg = f"Function executed successfully, but I couldn't generate a follow-up response due to an API error: {str(e)}"
+        print(Fore.YELLOW + error_msg + Style.RESET_ALL)
+        fallback_response = "The function was executed successfully, but I'm having trouble generating a response right now."
+    else:
+        if first_turn:
+            error_msg = f"🚫 Unexpected error: {str(e)}"
+            print(Fore.RED + error_msg + Style.RESET_ALL)
+            return add_to_history(history, "assistant", "I encountered an unexpected error. Please try your request again.")
+        error_msg = f"Function executed successfully, but encountered an unexpected error: {describe_error(e)}"
+        print(Fore.YELLOW + error_msg + Style.RESET_ALL)
+        fallback_response = "The function was executed successfully."
+    print_ai_response(fallback_response)
+    return add_to_history(history, "assistant", fallback_response)
+
+
+def record_call_limit_reached(history, max_function_calls):
+    """Stops a turn that hit the function call limit with a fallback reply."""
+    warning_msg = f"⚠️  Maximum function calls ({max_function_calls}) reached. Stopping to prevent infinite loops."
+    print(Fore.YELLOW + warning_msg + Style.RESET_ALL)
+    fallback_response = "I've completed multiple function calls but need to stop here to prevent excessive operations."
+    print_ai_response(fallback_response)
+    return add_to_history(history, "assistant", fallback_response)
+
+
+def process_user_input(user_input, history, gemini_client, config, image_handler, session=None, stream=STREAM_RESPONSES):
+    """Processes user input, sends it to Gemini, handles function calls, and lets the AI answer after function calls."""
+    if session is None:
+        session = ConversationSession()
     
     # Increment message count for bubble expiration tracking
     increment_message_count()
     
     history = add_to_history(history, "user", user_input)
-    messages = build_gemini_messages(history)
-    
-    # If an image is pasted, add it to the messages
     image_path = image_handler.get_current_image_path()
-    if image_path is not None and os.path.exists(image_path):
-        image = Image.open(image_path)
-        messages.append(image)
-
-    try:
-        response = gemini_client.generate_content(
-            model_name="gemini-2.5-flash",
-            config=config,
-            contents=messages
-        )
-    except APIError as e:
-        error_msg = f"🚫 API Error: {str(e)}"
-        print(Fore.RED + error_msg + Style.RESET_ALL)
-        history = add_to_history(history, "assistant", "I'm sorry, but I'm having trouble connecting to my AI service right now. Please try your request again in a moment.")
-        return history
-    except Exception as e:
-        error_msg = f"🚫 Unexpected error: {str(e)}"
-        print(Fore.RED + error_msg + Style.RESET_ALL)
-        history = add_to_history(history, "assistant", "I encountered an unexpected error. Please try your request again.")
-        return history
     
     # Handle compositional function calling with a loop
     max_function_calls = 10  # Prevent infinite loops
     function_call_count = 0
+    first_turn = True
     
     while function_call_count < max_function_calls:
-        parts = response.candidates[0].content.parts
-        function_called = False
-        text_content = ""
+        request_config, messages = prepare_request(session, history, gemini_client, config)
         
-        # Process all parts in the response
-        for part in parts:
-            if hasattr(part, "function_call") and part.function_call:
-                # Handle function call
-                function_name = part.function_call.name
-                function_args = part.function_call.args
-                print(Fore.LIGHTRED_EX + f"Function call detected: {function_name} with arguments {function_args}" + Style.RESET_ALL + "\n---------------------------------------------------------------")
-                
-                # Execute the function and get the result
-                history_before = len(history)
-                history = handle_function_call(function_name, function_args, history)
-                
-                # Get the function result from the last added history entry
-                function_result = ""
-                if len(history) > history_before:
-                    function_result = history[-1]["content"]
-                
-                # Add a message to history indicating the function was executed with its result
-                # This helps Gemini understand that the function was called and what the result was
-                function_execution_msg = f"Function '{function_name}' was executed with arguments {function_args}. Result: {function_result}"
-                history = add_to_history(history, "user", function_execution_msg)
-                
-                function_called = True
-                function_call_count += 1
-            elif hasattr(part, "text") and part.text:
-                # Collect text content but don't display it immediately if functions are being called
-                text_content += part.text
+        # If an image is pasted, add it to the first request
+        if first_turn and image_path is not None and os.path.exists(image_path):
+            messages.append(Image.open(image_path))
+        
+        try:
+            text_content, calls_made, history, error = run_model_turn(
+                gemini_client, request_config, messages, history, stream
+            )
+        except Exception as e:
+            calls_made, error = 0, e
+        if error is not None:
+            # Calls dispatched before the failure ran, so report it as a follow-up error
+            nothing_ran = first_turn and not calls_made
+            history = record_model_error(history, error, nothing_ran)
+            if nothing_ran:
+                return history
+            break
+        
+        first_turn = False
+        function_call_count += calls_made
         
         # If no function was called, display any text content and exit
-        if not function_called:
+        if not calls_made:
             if text_content.strip():
                 print_ai_response(text_content)
                 history = add_to_history(history, "assistant", text_content)
             break  # Exit the loop since no more function calls are needed
         
-        # If function(s) were called, don't display the text content (it might be hallucinated)
+        # If function(s) were called, don't keep the text content (it might be hallucinated)
         # Instead, get the AI's next response based on the function results
-        messages = build_gemini_messages(history)
-        try:
-            response = gemini_client.generate_content(
-                model_name="gemini-2.5-flash",
+    
+    # Safety check for maximum function calls reached
+    if function_call_count >= max_function_calls:
+        history = record_call_limit_reached(history, max_function_calls)
+
+    # Clean up the pasted image after processing
+    if image_path is not None:
+        image_handler.cleanup_image(image_path)
+    
+    return history
+
+
+async def aiter_response_parts(gemini_client, config, messages, stream):
+    """Async variant of iter_response_parts."""
+    if stream:
+        responses = gemini_client.generate_content_stream_async(
+            model_name=MODEL_NAME,
+            config=config,
+            contents=messages
+        )
+    else:
+        async def single_response():
+            yield await gemini_client.generate_content_async(
+                model_name=MODEL_NAME,
                 config=config,
                 contents=messages
             )
-        except APIError as e:
-            error_msg = f"Function executed successfully, but I couldn't generate a follow-up response due to an API error: {str(e)}"
-            print(Fore.YELLOW + error_msg + Style.RESET_ALL)
-            fallback_response = "The function was executed successfully, but I'm having trouble generating a response right now."
-            print_ai_response(fallback_response)
-            history = add_to_history(history, "assistant", fallback_response)
-            break
+        responses = single_response()
+    async for response in responses:
+        if not response.candidates or not response.candidates[0].content:
+            continue
+        for part in response.candidates[0].content.parts or []:
+            yield part
+
+
+async def run_model_turn_async(gemini_client, config, messages, history, stream):
+    """Async variant of run_model_turn; function calls run while the stream is still being read."""
+    text_content = ""
+    dispatcher = AsyncFunctionCallDispatcher()
+    error = None
+
+    try:
+        async for part in aiter_response_parts(gemini_client, config, messages, stream):
+            if getattr(part, "thought", False):
+                continue
+            if hasattr(part, "function_call") and part.function_call:
+                function_name = part.function_call.name
+                function_args = part.function_call.args
+                print(Fore.LIGHTRED_EX + f"Function call detected: {function_name} with arguments {function_args}" + Style.RESET_ALL + "\n---------------------------------------------------------------")
+                await dispatcher.submit(function_name, function_args)
+            elif hasattr(part, "text") and part.text:
+                text_content += part.text
+    except Exception as e:
+        error = e
+
+    history = record_function_results(history, await dispatcher.results())
+    return text_content, len(dispatcher.calls), history, error
+
+
+async def process_user_input_async(user_input, history, gemini_client, config, image_handler, session=None, stream=STREAM_RESPONSES):
+    """asyncio variant of process_user_input.
+
+    Model calls use the SDK's aio interface and function calls run as tasks,
+    so tool I/O and model streaming overlap without blocking the event loop.
+    """
+    if session is None:
+        session = ConversationSession()
+
+    # Increment message count for bubble expiration tracking
+    increment_message_count()
+
+    history = add_to_history(history, "user", user_input)
+    image_path = image_handler.get_current_image_path()
+
+    max_function_calls = 10  # Prevent infinite loops
+    function_call_count = 0
+    first_turn = True
+
+    while function_call_count < max_function_calls:
+        # Context cache creation is a blocking SDK call, so keep it off the event loop
+        request_config, messages = await asyncio.to_thread(prepare_request, session, history, gemini_client, config)
+
+        if first_turn and image_path is not None and os.path.exists(image_path):
+            messages.append(Image.open(image_path))
+
+        try:
+            text_content, calls_made, history, error = await run_model_turn_async(
+                gemini_client, request_config, messages, history, stream
+            )
         except Exception as e:
-            # Handle various types of errors more gracefully
-            try:
-                # Try to get error message safely
-                if hasattr(e, 'message'):
-                    error_details = e.message
-                elif hasattr(e, 'args') and e.args:
-                    error_details = str(e.args[0])
-                else:
-                    error_details = type(e).__name__
-            except:
-                error_details = type(e).__name__
-            
-            error_msg = f"Function executed successfully, but encountered an unexpected error: {error_details}"
-            print(Fore.YELLOW + error_msg + Style.RESET_ALL)
-            fallback_response = "The function was executed successfully."
-            print_ai_response(fallback_response)
-            history = add_to_history(history, "assistant", fallback_response)
+            calls_made, error = 0, e
+        if error is not None:
+            nothing_ran = first_turn and not calls_made
+            history = record_model_error(history, error, nothing_ran)
+            if nothing_ran:
+                return history
             break
-    
-    # Safety check for maximum function calls reached
+
+        first_turn = False
+        function_call_count += calls_made
+
+        if not calls_made:
+            if text_content.strip():
+                print_ai_response(text_content)
+                history = add_to_history(history, "assistant", text_content)
+            break
+
     if function_call_count >= max_function_calls:
-        warning_msg = f"⚠️  Maximum function calls ({max_function_calls}) reached. Stopping to prevent infinite loops."
-        print(Fore.YELLOW + warning_msg + Style.RESET_ALL)
-        fallback_response = "I've completed multiple function calls but need to stop here to prevent excessive operations."
-        print_ai_response(fallback_response)
-        history = add_to_history(history, "assistant", fallback_response)
+        history = record_call_limit_reached(history, max_function_calls)
 
-    # Clean up the pasted image after processing
     if image_path is not None:
         image_handler.cleanup_image(image_path)
-    
-    return history
\ No newline at end of file
+
+    return history
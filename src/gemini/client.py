@@ -6,10 +6,15 @@ This module handles:
 - Tool configuration with function declarations
 - Content generation configuration
 - System prompt loading
+- Optional context caching of the stable request prefix
+- Blocking, streaming and asyncio request variants
 
 Extracted from assistant.py to improve code organization and maintainability.
 """
 import os
+import time
+import asyncio
+import hashlib
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
@@ -20,14 +25,107 @@ from datetime import datetime
 # Load environment variables
 load_dotenv()
 
+# Context caching: upload the system prompt, tools and memory once and reuse them
+CONTEXT_CACHE_ENABLED = os.getenv('GEMINI_CONTEXT_CACHE', '0') == '1'
+CONTEXT_CACHE_TTL = 3600  # seconds
+CONTEXT_CACHE_REFRESH_MARGIN = 60  # Recreate the cache this many seconds before it expires
+CONTEXT_CACHE_RETRY_DELAY = 60  # Seconds before retrying a failed cache creation; doubles per failure
+
+
+class ContextCache:
+    """Keeps the stable request prefix in a Gemini cached content resource.
+
+    The prefix is the system prompt, tool declarations and memory messages.
+    It is uploaded once and its handle is reused until the prefix changes or
+    the cache is about to expire. `caches` is anything with the interface of
+    `genai.Client().caches` (create/delete), so a local fake can stand in.
+    """
+
+    def __init__(self, caches, ttl=CONTEXT_CACHE_TTL):
+        self.caches = caches
+        self.ttl = ttl
+        self.name = None
+        self.fingerprint = None
+        self.expires_at = 0
+        self.failed_fingerprint = None
+        self.failures = 0  # Failed creations in a row for failed_fingerprint
+        self.retry_at = 0
+
+    @staticmethod
+    def compute_fingerprint(model_name, config, prefix_contents):
+        """Hash everything that goes into the cached prefix."""
+        digest = hashlib.sha256(model_name.encode("utf-8"))
+        digest.update(config.model_dump_json(exclude_none=True).encode("utf-8"))
+        for content in prefix_contents:
+            digest.update(content.model_dump_json(exclude_none=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _delete_current(self):
+        """Delete the current cache resource, ignoring failures (it expires anyway)."""
+        if self.name is None:
+            return
+        try:
+            self.caches.delete(name=self.name)
+        except Exception:
+            pass
+        self.name = None
+
+    def _create(self, model_name, config, prefix_contents, fingerprint):
+        """Upload the prefix as a new cache resource. Returns True on success."""
+        try:
+            cache = self.caches.create(
+                model=model_name,
+                config=types.CreateCachedContentConfig(
+                    display_name="personal-ai-prefix",
+                    system_instruction=config.system_instruction,
+                    tools=config.tools,
+                    tool_config=config.tool_config,
+                    contents=prefix_contents or None,
+                    ttl=f"{self.ttl}s",
+                ),
+            )
+        except Exception as e:
+            # Usually the prefix is below the model's minimum cacheable size
+            # Retry later with a growing delay, since the error may be transient
+            if fingerprint != self.failed_fingerprint:
+                self.failed_fingerprint = fingerprint
+                self.failures = 0
+            self.failures += 1
+            delay = min(CONTEXT_CACHE_RETRY_DELAY * 2 ** (self.failures - 1), self.ttl)
+            self.retry_at = time.time() + delay
+            print(f"⚠️  Context cache unavailable, sending the prompt inline (retrying in {delay}s): {e}")
+            return False
+        self.failed_fingerprint = None
+        self.failures = 0
+        self._delete_current()
+        self.name = cache.name
+        self.fingerprint = fingerprint
+        self.expires_at = time.time() + self.ttl
+        return True
+
+    def get_config(self, model_name, config, prefix_contents):
+        """Return a config that references the cached prefix, or None to send it inline."""
+        fingerprint = self.compute_fingerprint(model_name, config, prefix_contents)
+        if fingerprint == self.failed_fingerprint and time.time() < self.retry_at:
+            return None
+        stale = time.time() >= self.expires_at - CONTEXT_CACHE_REFRESH_MARGIN
+        if fingerprint != self.fingerprint or stale:
+            if not self._create(model_name, config, prefix_contents, fingerprint):
+                return None
+        return types.GenerateContentConfig(
+            cached_content=self.name,
+            thinking_config=config.thinking_config,
+        )
+
 
 class GeminiClient:
     """Wrapper for Gemini API client with configured tools and settings."""
     
-    def __init__(self):
+    def __init__(self, use_context_cache=CONTEXT_CACHE_ENABLED):
         """Initialize the Gemini client with API key from environment."""
         self.api_key = os.getenv('GEMINI_API_KEY')
         self.client = genai.Client(api_key=self.api_key)
+        self.context_cache = ContextCache(self.client.caches) if use_context_cache else None
         
     def get_grounding_tool(self):
         """Returns the AI tool configuration with all function declarations."""
@@ -48,40 +146,140 @@ class GeminiClient:
             ),
         )
     
+    def get_cached_config(self, model_name, config, prefix_contents):
+        """Returns a config using the cached prefix, or None when caching is off or unavailable."""
+        if self.context_cache is None:
+            return None
+        return self.context_cache.get_config(model_name, config, prefix_contents)
+
+    MAX_RETRIES = 3
+    INITIAL_RETRY_DELAY = 2  # seconds
+
+    def _check_retry(self, error, attempt):
+        """Decides whether a failed request should be retried.
+
+        Returns True for a retryable server error; otherwise raises the
+        matching APIError for the caller to handle.
+        """
+        from google.genai.errors import ServerError, ClientError, APIError
+
+        max_retries = self.MAX_RETRIES
+        if isinstance(error, ServerError):
+            if error.status_code == 500 and attempt < max_retries - 1:
+                retry_delay = self.INITIAL_RETRY_DELAY * 2 ** attempt  # Exponential backoff
+                print(f"⚠️  Gemini API server error (attempt {attempt + 1}/{max_retries}). Retrying in {retry_delay} seconds...")
+                return True
+            print(f"❌ Gemini API server error after {max_retries} attempts: {error.message}")
+            raise APIError(f"Gemini API is temporarily unavailable. Please try again later. (Error: {error.message})")
+        if isinstance(error, ClientError):
+            print(f"❌ Gemini API client error: {error.message}")
+            raise APIError(f"Invalid request to Gemini API: {error.message}")
+        print(f"❌ Unexpected error communicating with Gemini API: {str(error)}")
+        raise APIError(f"Failed to communicate with Gemini API: {str(error)}")
+
     def generate_content(self, model_name, config, contents):
         """Generate content using the Gemini API with retry logic and error handling."""
-        import time
-        from google.genai.errors import ServerError, ClientError, APIError
-        
-        max_retries = 3
-        retry_delay = 2  # seconds
-        
-        for attempt in range(max_retries):
+        from google.genai.errors import APIError
+
+        for attempt in range(self.MAX_RETRIES):
             try:
                 return self.client.models.generate_content(
                     model=model_name,
                     config=config,
                     contents=contents
                 )
-            except ServerError as e:
-                if e.status_code == 500 and attempt < max_retries - 1:
-                    print(f"⚠️  Gemini API server error (attempt {attempt + 1}/{max_retries}). Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    print(f"❌ Gemini API server error after {max_retries} attempts: {e.message}")
-                    raise APIError(f"Gemini API is temporarily unavailable. Please try again later. (Error: {e.message})")
-            except ClientError as e:
-                print(f"❌ Gemini API client error: {e.message}")
-                raise APIError(f"Invalid request to Gemini API: {e.message}")
             except Exception as e:
-                print(f"❌ Unexpected error communicating with Gemini API: {str(e)}")
-                raise APIError(f"Failed to communicate with Gemini API: {str(e)}")
-        
+                self._check_retry(e, attempt)
+                time.sleep(self.INITIAL_RETRY_DELAY * 2 ** attempt)
+
         # This shouldn't be reached, but just in case
         raise APIError("Failed to generate content after multiple retries")
 
+    def generate_content_stream(self, model_name, config, contents):
+        """Stream content chunks from the Gemini API as they are generated.
+
+        Retries only happen while opening the stream (before the first chunk
+        arrives); a failure mid-stream is raised as APIError.
+        """
+        from google.genai.errors import APIError
+
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                stream = self.client.models.generate_content_stream(
+                    model=model_name,
+                    config=config,
+                    contents=contents
+                )
+                first_chunk = next(stream, None)
+                break
+            except Exception as e:
+                self._check_retry(e, attempt)
+                time.sleep(self.INITIAL_RETRY_DELAY * 2 ** attempt)
+        else:
+            raise APIError("Failed to generate content after multiple retries")
+
+        if first_chunk is None:
+            return
+        yield first_chunk
+        try:
+            yield from stream
+        except APIError:
+            raise
+        except Exception as e:
+            print(f"❌ Gemini API stream interrupted: {str(e)}")
+            raise APIError(f"Gemini API stream was interrupted: {str(e)}")
+
+    async def generate_content_async(self, model_name, config, contents):
+        """Async variant of generate_content using the SDK's aio interface."""
+        from google.genai.errors import APIError
+
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                return await self.client.aio.models.generate_content(
+                    model=model_name,
+                    config=config,
+                    contents=contents
+                )
+            except Exception as e:
+                self._check_retry(e, attempt)
+                await asyncio.sleep(self.INITIAL_RETRY_DELAY * 2 ** attempt)
+
+        raise APIError("Failed to generate content after multiple retries")
+
+    async def generate_content_stream_async(self, model_name, config, contents):
+        """Async variant of generate_content_stream; yields chunks as they arrive."""
+        from google.genai.errors import APIError
+
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                stream = await self.client.aio.models.generate_content_stream(
+                    model=model_name,
+                    config=config,
+                    contents=contents
+                )
+                try:
+                    first_chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    first_chunk = None
+                break
+            except Exception as e:
+                self._check_retry(e, attempt)
+                await asyncio.sleep(self.INITIAL_RETRY_DELAY * 2 ** attempt)
+        else:
+            raise APIError("Failed to generate content after multiple retries")
+
+        if first_chunk is None:
+            return
+        yield first_chunk
+        try:
+            async for chunk in stream:
+                yield chunk
+        except APIError:
+            raise
+        except Exception as e:
+            print(f"❌ Gemini API stream interrupted: {str(e)}")
+            raise APIError(f"Gemini API stream was interrupted: {str(e)}")
+
 
 def load_system_prompt():
     """Load the system prompt from prompt.txt."""
@@ -78,7 +78,7 @@ def get_files_functions():
     """Returns the function declaration for managing files and directories."""
     return {
         "name": "files",
-        "description": "Manage files and directories: create, write, read, delete, copy, move, rename, list, search, create a directory, create PDF files, or create various document types.",
+        "description": "Manage files and directories: create, write, read, delete, copy, move, rename, list, search by name, grep (find text inside files), create a directory, create PDF files, create various document types, or do any of create/write/delete/copy/move/rename on many files at once.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -86,13 +86,14 @@ def get_files_functions():
                     "type": "string",
                     "enum": [
                         "create", "write", "read", "delete", "copy", "move",
-                        "rename", "list", "search", "createDir", "createPdf", "createDoc"
+                        "rename", "list", "search", "grep", "createDir", "createPdf", "createDoc",
+                        "batchCreate", "batchWrite", "batchDelete", "batchCopy", "batchMove", "batchRename"
                     ],
-                    "description": "File/directory action.",
+                    "description": "File/directory action. The batch* actions apply one operation to many files ('paths' and/or 'glob') in a single call; always prefer them over repeating a single-file action.",
                 },
                 "path": {
                     "type": "string",
-                    "description": "Path of the file/directory (include name). For 'search', only the directory path.",
+                    "description": "Path of the file/directory (include name). For 'search', only the directory path. Required for every action except copy/move and the batch actions.",
                 },
                 "content": {
                     "type": "string",
@@ -104,7 +105,7 @@ def get_files_functions():
                 },
                 "destination_path": {
                     "type": "string",
-                    "description": "Destination path (for copy/move).",
+                    "description": "Destination path (for copy/move); the destination directory for 'batchCopy'/'batchMove'.",
                 },
                 "new_name": {
                     "type": "string",
@@ -112,7 +113,12 @@ def get_files_functions():
                 },
                 "file_name": {
                     "type": "string",
-                    "description": "File name to search (for 'search'). Good only for searching by specific file name.",
+                    "description": "File name or pattern to search (for 'search'). Interpreted according to 'match'.",
+                },
+                "match": {
+                    "type": "string",
+                    "enum": ["exact", "substring", "glob", "fuzzy"],
+                    "description": "How 'file_name' is matched (for 'search'): exact name (default), substring of the name, glob pattern like '*.pdf', or fuzzy (letters in order, e.g. 'rprt' finds 'report.docx'). Case-insensitive.",
                 },
                 "title": {
                     "type": "string",
@@ -126,9 +132,84 @@ def get_files_functions():
                 "date_filter": {
                     "type": "string",
                     "description": "Filter files by date (for 'list' action). Formats: 'YYYY-MM-DD' (exact date), '>= YYYY-MM-DD' or 'after: YYYY-MM-DD' (on or after), '<= YYYY-MM-DD' or 'before: YYYY-MM-DD' (on or before), 'today', 'yesterday', 'last 7 days', 'last week', 'last month'.",
+                },
+                "paths": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "For 'list': more directories to list together with 'path', newest first. For batch actions: the files to act on.",
+                },
+                "recursive": {
+                    "type": "boolean",
+                    "description": "Include files in subdirectories (for 'list', defaults to false; for 'grep', defaults to true). Combine with 'date_filter' or 'limit' for e.g. 'files changed this week under ~/projects'.",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Only return the N most recently modified entries (for 'list').",
+                },
+                "glob": {
+                    "type": "string",
+                    "description": "Glob pattern selecting the files for a batch action, e.g. 'C:/Photos/*.jpg' or '~/notes/**/*.txt'. Combined with 'paths' if both are given.",
+                },
+                "contents": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "One content per entry of 'paths' (for 'batchWrite'/'batchCreate'). Use 'content' instead to write the same text to every file.",
+                },
+                "rename_template": {
+                    "type": "string",
+                    "description": "New name for each file (for 'batchRename'), using {name} (old name without extension), {ext} (extension with dot), {n} (running number, e.g. {n:03} for 001), {parent} (folder name) and {date} (modified date YYYY-MM-DD). Example: 'holiday_{n:03}{ext}'. Files are numbered in path order.",
+                },
+                "start_number": {
+                    "type": "integer",
+                    "description": "First value of {n} (for 'batchRename'). Defaults to 1.",
+                },
+                "start_line": {
+                    "type": "integer",
+                    "description": "First line to read, 1-based (for 'read'). Use with 'end_line' to read part of a large file.",
+                },
+                "end_line": {
+                    "type": "integer",
+                    "description": "Last line to read, inclusive (for 'read').",
+                },
+                "offset": {
+                    "type": "integer",
+                    "description": "Byte offset to start reading at (for 'read').",
+                },
+                "length": {
+                    "type": "integer",
+                    "description": "Number of bytes to read from 'offset' (for 'read').",
+                },
+                "max_tokens": {
+                    "type": "integer",
+                    "description": "Approximate size limit of the returned text (for 'read'). Larger files are shown as head and tail with the total line count. Defaults to 8000.",
+                },
+                "pattern": {
+                    "type": "string",
+                    "description": "Text to find inside files (for 'grep'). 'path' may be a directory or a single file. Returns matching lines with line numbers, so prefer it over reading whole files.",
+                },
+                "regex": {
+                    "type": "boolean",
+                    "description": "Treat 'pattern' as a regular expression (for 'grep'). Defaults to plain text.",
+                },
+                "case_sensitive": {
+                    "type": "boolean",
+                    "description": "Match case exactly (for 'grep'). Defaults to false.",
+                },
+                "extensions": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only search files with these extensions, e.g. ['.py', '.txt'] (for 'grep').",
+                },
+                "max_size_mb": {
+                    "type": "number",
+                    "description": "Skip files larger than this many MB (for 'grep'). Defaults to 50.",
+                },
+                "max_matches": {
+                    "type": "integer",
+                    "description": "Matching lines shown per file (for 'grep'). Defaults to 5.",
                 }
             },
-            "required": ["action", "path"]
+            "required": ["action"]
         },
     }
 
@@ -246,14 +327,14 @@ def get_gmail_functions():
     """Returns the function declaration for Gmail operations."""
     return {
         "name": "gmail",
-        "description": "Send emails through Gmail with or without attachments, retrieve recent emails, or fetch a specific email by ID.",
+        "description": "Send emails through Gmail with or without attachments, retrieve recent emails, fetch a specific email by ID, or search previously synced emails.",
         "parameters": {
             "type": "object",
             "properties": {
                 "action": {
                     "type": "string",
-                    "enum": ["send", "send_with_attachment", "get", "get_by_id"],
-                    "description": "Gmail action: send regular email, send email with attachment, get recent emails, or get a specific email by ID.",
+                    "enum": ["send", "send_with_attachment", "get", "get_by_id", "search"],
+                    "description": "Gmail action: send regular email, send email with attachment, get recent emails, get a specific email by ID, or search the local email cache.",
                 },
                 "to": {
                     "type": "string",
@@ -271,6 +352,11 @@ def get_gmail_functions():
                     "type": "string",
                     "description": "Full path to the attachment file (for 'send_with_attachment' action).",
                 },
+                "attachment_paths": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Full paths of several attachment files (for 'send_with_attachment' action with more than one file).",
+                },
                 "count": {
                     "type": "integer",
                     "description": "Number of recent emails to retrieve (for 'get' action). Defaults to 10 if not specified.",
@@ -280,6 +366,10 @@ def get_gmail_functions():
                 "id": {
                     "type": "string",
                     "description": "Gmail message ID (for 'get_by_id' action).",
+                },
+                "query": {
+                    "type": "string",
+                    "description": "Words to look for in subject, sender and body (for 'search' action). Returns the best-ranked matches with snippets; use 'count' to limit results (default 5). Prefer this over fetching many emails with 'get'.",
                 }
             },
             "required": ["action"],
@@ -14,6 +14,9 @@ from utils.bubble_manager import (
     get_bubble_context as _get_bubble_context
 )
 
+# Bubbles share one in-memory store and file
+SEQUENTIAL_ACTIONS = True
+
 
 def execute(args):
     """
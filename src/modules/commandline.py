@@ -1,5 +1,10 @@
 import subprocess
 import os
+import asyncio
+import locale
+
+# Shell commands can depend on each other's side effects
+SEQUENTIAL_ACTIONS = True
 
 def execute(args):
     """
@@ -24,3 +29,32 @@ def execute(args):
         return output if output else "Command executed, but there was no output."
     except Exception as e:
         return f"Error executing command: {str(e)}"
+
+
+async def execute_async(args):
+    """
+    Async variant of execute for the asyncio pipeline.
+    Runs the command as an asyncio subprocess so the event loop stays free while it runs.
+    """
+    if not args or "command" not in args:
+        return "No command provided."
+
+    command = args.get("command")
+    path = args.get("path", None)
+    cwd = path if path and os.path.isdir(path) else None
+
+    try:
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+        )
+        stdout, stderr = await process.communicate()
+        encoding = locale.getpreferredencoding(False)
+        stdout = stdout.decode(encoding, errors="replace")
+        stderr = stderr.decode(encoding, errors="replace")
+        output = stdout.strip() if stdout else stderr.strip()
+        return output if output else "Command executed, but there was no output."
+    except Exception as e:
+        return f"Error executing command: {str(e)}"
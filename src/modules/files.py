@@ -3,52 +3,126 @@
 #Command: files createPdf [path\file name] [content] [title]
 #Command: files createDoc [path\file name] [content] [doc_type]
 #Command: files write [path\file name] [content]
-#Command: files read [path\file name]
+#Command: files read [path\file name] [start_line] [end_line] [offset] [length]
 #Command: files delete [path\file name]
 #Command: files copy [source path] [destination path]
 #Command: files move [source path] [destination path]
 #Command: files rename [path] [old name] [new name]
-#Command: files list [path] [date_filter] [show_details]
-#Command: files search [path] [file name]
+#Command: files list [path|paths] [date_filter] [show_details] [recursive] [limit]
+#Command: files search [path] [file name] [match]
+#Command: files batchCreate|batchWrite|batchDelete|batchCopy|batchMove|batchRename [paths] [glob] [contents] [destination_path] [rename_template]
+#Command: files grep [path] [pattern] [regex] [case_sensitive] [extensions] [max_size_mb] [max_matches]
 
 
+import fnmatch
+import heapq
 import os
-import shutil
+import sqlite3
+
+from utils.copy_engine import copy_path, move_path
+from utils.crawler import walk_entries
+from utils.fs_watcher import get_directory_watcher
+
+# Actions that change the filesystem stay ordered; read/list/search may run concurrently
+SEQUENTIAL_ACTIONS = {"create", "createdir", "createpdf", "createdoc", "write", "delete", "copy", "move", "rename",
+                      "batchcreate", "batchwrite", "batchdelete", "batchcopy", "batchmove", "batchrename"}
+
+SEARCH_RESULT_LIMIT = 50
+LIST_RESULT_LIMIT = 200  # Default cap for recursive and multi-directory listings
+GREP_MAX_SIZE_MB = 50  # Default size limit for files searched by grep
+GREP_MAX_MATCHES = 5  # Default matching lines shown per file
+GREP_MAX_FILES = 50  # Files with matches shown before grep stops
+BATCH_LIMIT = 1000  # Most paths one batch action may touch
+BATCH_REPORT_LINES = 10  # Changes and failures listed individually in a batch summary
+PDF_STORY_BUFFER = 64  # Flowables created ahead of the layout when building a PDF
+HTML_WRITE_BLOCK = 1024 * 1024  # Characters converted and written per step for HTML documents
+
+_pdf_styles = None  # Built by get_pdf_styles on first use
+READ_TOKEN_BUDGET = int(os.getenv('FILES_READ_TOKEN_BUDGET', '8000'))  # Larger reads are cut to head and tail
+CHARS_PER_TOKEN = 4  # Rough estimate used to turn the token budget into characters
+ENCODING_SAMPLE_SIZE = 64 * 1024  # Bytes inspected to pick a file's encoding
+LINE_COUNT_BLOCK = 1024 * 1024  # Bytes per read when counting lines
+
+
+def get_pdf_styles():
+    """reportlab's sample styles, built once instead of on every PDF."""
+    global _pdf_styles
+    if _pdf_styles is None:
+        from reportlab.lib.styles import getSampleStyleSheet
+        _pdf_styles = getSampleStyleSheet()
+    return _pdf_styles
+
+
+def iter_paragraphs(content):
+    """Yield the non-empty paragraphs (separated by blank lines) of content one at a time."""
+    start = 0
+    while start < len(content):
+        end = content.find('\n\n', start)
+        if end == -1:
+            end = len(content)
+        paragraph = content[start:end].strip()
+        if paragraph:
+            yield paragraph
+        start = end + 2
+
+
+class StreamedStory(list):
+    """A reportlab story filled from an iterator while the document is laid out.
+
+    doc.build() consumes its story from the front and checks len() before
+    every flowable. Topping the list up there keeps only a few flowables
+    alive at a time, instead of one object per paragraph of the whole
+    document.
+    """
+
+    def __init__(self, flowables, buffer_size=PDF_STORY_BUFFER):
+        super().__init__()
+        self._source = iter(flowables)
+        self._buffer_size = buffer_size
+
+    def __len__(self):
+        while self._source is not None and super().__len__() < self._buffer_size:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return super().__len__()
+
+
+# Extension added to document paths that lack it; other types are written as .txt
+DOCUMENT_EXTENSIONS = {"pdf": ".pdf", "html": ".html", "md": ".md", "markdown": ".md", "csv": ".csv", "json": ".json"}
+
+
+def document_path(path, doc_type="pdf"):
+    """The path a document is written to: path with its type's extension added if missing."""
+    extension = DOCUMENT_EXTENSIONS.get(doc_type.lower(), ".txt")
+    return path if path.lower().endswith(extension) else path + extension
 
 
 def create_pdf(path, content, title="Document"):
     """Create a PDF file with the given content."""
     try:
-        from reportlab.pdfgen import canvas
         from reportlab.lib.pagesizes import letter
-        from reportlab.lib.styles import getSampleStyleSheet
         from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
         
         # Ensure the path has .pdf extension
-        if not path.lower().endswith('.pdf'):
-            path += '.pdf'
+        path = document_path(path, "pdf")
         
         # Create the PDF document
         doc = SimpleDocTemplate(path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Add title
-        title_style = styles['Title']
-        story.append(Paragraph(title, title_style))
-        story.append(Spacer(1, 12))
-        
-        # Add content
-        normal_style = styles['Normal']
-        # Split content by paragraphs and add each as a separate paragraph
-        paragraphs = content.split('\n\n')
-        for para in paragraphs:
-            if para.strip():
-                story.append(Paragraph(para.strip(), normal_style))
-                story.append(Spacer(1, 6))
+        styles = get_pdf_styles()
+
+        def flowables():
+            # Add title
+            yield Paragraph(title, styles['Title'])
+            yield Spacer(1, 12)
+            # Add content, each paragraph as a separate flowable
+            for para in iter_paragraphs(content):
+                yield Paragraph(para, styles['Normal'])
+                yield Spacer(1, 6)
         
-        # Build the PDF
-        doc.build(story)
+        # Build the PDF, creating flowables only as the layout reaches them
+        doc.build(StreamedStory(flowables()))
         return f"PDF created at {path}."
         
     except ImportError:
@@ -57,21 +131,13 @@ def create_pdf(path, content, title="Document"):
         return f"Error creating PDF: {str(e)}"
 
 
-def create_document(path, content, doc_type="txt"):
-    """Create various document types."""
-    doc_type = doc_type.lower()
-    
-    if doc_type == "pdf":
-        return create_pdf(path, content)
-    
-    elif doc_type == "html":
-        if not path.lower().endswith('.html'):
-            path += '.html'
-        
-        html_content = f"""<!DOCTYPE html>
+def write_html_document(path, content, title="Document"):
+    """Write content as an HTML page, converting newlines to <br> a block at a time."""
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"""<!DOCTYPE html>
 <html>
 <head>
-    <title>Document</title>
+    <title>{title}</title>
     <meta charset="UTF-8">
     <style>
         body {{ font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }}
@@ -80,21 +146,33 @@ def create_document(path, content, doc_type="txt"):
     </style>
 </head>
 <body>
-    <h1>Document</h1>
-    {content.replace(chr(10), '<br>')}
+    <h1>{title}</h1>
+    """)
+        for start in range(0, len(content), HTML_WRITE_BLOCK):
+            file.write(content[start:start + HTML_WRITE_BLOCK].replace('\n', '<br>'))
+        file.write("""
 </body>
-</html>"""
+</html>""")
+
+
+def create_document(path, content, doc_type="txt"):
+    """Create various document types."""
+    doc_type = doc_type.lower()
+    
+    if doc_type == "pdf":
+        return create_pdf(path, content)
+    
+    elif doc_type == "html":
+        path = document_path(path, doc_type)
         
         try:
-            with open(path, "w", encoding="utf-8") as file:
-                file.write(html_content)
+            write_html_document(path, content)
             return f"HTML document created at {path}."
         except Exception as e:
             return f"Error creating HTML document: {str(e)}"
     
     elif doc_type == "md" or doc_type == "markdown":
-        if not path.lower().endswith('.md'):
-            path += '.md'
+        path = document_path(path, doc_type)
         
         try:
             with open(path, "w", encoding="utf-8") as file:
@@ -104,8 +182,7 @@ def create_document(path, content, doc_type="txt"):
             return f"Error creating Markdown document: {str(e)}"
     
     elif doc_type == "csv":
-        if not path.lower().endswith('.csv'):
-            path += '.csv'
+        path = document_path(path, doc_type)
         
         try:
             with open(path, "w", encoding="utf-8") as file:
@@ -115,8 +192,7 @@ def create_document(path, content, doc_type="txt"):
             return f"Error creating CSV document: {str(e)}"
     
     elif doc_type == "json":
-        if not path.lower().endswith('.json'):
-            path += '.json'
+        path = document_path(path, doc_type)
         
         try:
             import json
@@ -137,8 +213,7 @@ def create_document(path, content, doc_type="txt"):
     
     else:
         # Default to text file
-        if not path.lower().endswith('.txt'):
-            path += '.txt'
+        path = document_path(path, doc_type)
         
         try:
             with open(path, "w", encoding="utf-8") as file:
@@ -215,71 +290,461 @@ def check_date_match(file_timestamp, criteria):
     return False
 
 
-def filter_files_by_date(file_infos, date_filter):
-    """Filter files by date. Supports various date formats and operators."""
-    from datetime import datetime, timedelta
+def date_bounds(criteria):
+    """Convert date filter criteria into a (start, end) mtime range; end is exclusive, None is open."""
+    if not criteria:
+        return None, None
+    if criteria['type'] == 'after':
+        return criteria['timestamp'], None
+    if criteria['type'] == 'before':
+        return None, criteria['timestamp'] + 1  # The criteria's timestamp is 23:59:59 of the day
+    return criteria['start'], criteria['end']
+
+
+def format_timestamp(timestamp):
+    """Format a timestamp for listings."""
+    from datetime import datetime
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp else "Unknown"
+
+
+def list_newest_files(paths, date_filter, filter_criteria, recursive, limit):
+    """List entries under one or more directories, newest first.
+
+    Trees are answered from the file index, which keeps mtimes in a sorted
+    index, so date-filtered and "most recent" listings read only the rows
+    they return. Files edited in place by other programs show up after the
+    index's next background re-stat. Without recursive, only the listed
+    directories themselves are read, from the directory watcher.
+    """
+    start, end = date_bounds(filter_criteria)
+    capped = limit is None
+    if recursive:
+        from utils.file_index import get_file_index
+
+        index = get_file_index()
+        index.start_background_indexing()
+        for path in paths:
+            index.ensure_indexed(path)
+        file_infos = index.modified_between(paths, start, end, limit or LIST_RESULT_LIMIT)
+    else:
+        file_infos = []
+        for path in paths:
+            for info in get_directory_watcher().listing(path):
+                modified = info["modified"]
+                if modified is None or (start is not None and modified < start) or (end is not None and modified >= end):
+                    continue
+                file_infos.append({"path": os.path.join(os.path.abspath(path), info["name"]), "name": info["name"],
+                                   "is_dir": info["is_dir"], "modified": modified})
+        file_infos = heapq.nlargest(limit or LIST_RESULT_LIMIT, file_infos, key=lambda info: info["modified"])
+
+    scope = " and subdirectories" if recursive else ""
+    filter_text = f" (filtered by {date_filter})" if date_filter else ""
+    result_lines = [f"Files in {', '.join(paths)}{scope}{filter_text} (newest to oldest):"]
+    if not file_infos:
+        result_lines.append("No files found matching the criteria.")
+    for info in file_infos:
+        file_type = "[DIR]" if info["is_dir"] else "[FILE]"
+        result_lines.append(f"- {file_type} {info['path']} (modified: {format_timestamp(info['modified'])})")
+    if capped and len(file_infos) >= LIST_RESULT_LIMIT:
+        result_lines.append(f"(showing the {LIST_RESULT_LIMIT} most recent; set 'limit' to see a different number)")
+    return "\n".join(result_lines)
+
+
+def name_matches(name, query, match):
+    """Whether a file name matches a query in the given mode (case-insensitive)."""
+    name, query = name.lower(), query.lower()
+    if match == "exact":
+        return name == query
+    if match == "substring":
+        return query in name
+    if match == "glob":
+        return fnmatch.fnmatchcase(name, query)
+    # fuzzy: the query's characters appear in order
+    remaining = iter(name)
+    return all(char in remaining for char in query)
+
+
+def walk_search(path, file_name, match, limit):
+    """Search by crawling the tree; used when the file index is unavailable."""
+    matches = []
+    for entry in walk_entries(path):
+        if name_matches(entry.name, file_name, match):
+            matches.append(entry.path)
+            if len(matches) >= limit:
+                break
+    return matches
+
+
+def search_files(path, file_name, match="exact", limit=SEARCH_RESULT_LIMIT):
+    """Search a directory tree for names matching file_name.
+
+    Answers come from the persistent file index (utils/file_index.py); a
+    directory that is not indexed yet is crawled once. After that, changes
+    made through this module show up at once, and other changes within the
+    index's freshness window (see FileIndex.refresh_subtree).
+    """
+    from utils.file_index import MATCH_MODES, get_file_index
+
+    if match not in MATCH_MODES:
+        return(f"Unknown match mode '{match}'. Use one of: {', '.join(MATCH_MODES)}.")
+    if not os.path.isdir(path):
+        return(f"'{path}' is not a valid directory.")
+
+    try:
+        index = get_file_index()
+        index.start_background_indexing()
+        index.ensure_indexed(path)
+        matches = index.search(path, file_name, match, limit)
+    except sqlite3.Error as e:
+        print(f"Warning: File index unavailable, searching the directory tree instead: {e}")
+        matches = walk_search(path, file_name, match, limit)
+
+    if not matches:
+        return(f"File '{file_name}' not found in '{path}' or its subdirectories.")
+    if match == "exact" and len(matches) == 1:
+        return(f"File found at: {matches[0]}")
+    lines = [f"Found {len(matches)} matches for '{file_name}' in '{path}':"]
+    lines.extend(f"- {found}" for found in matches)
+    if len(matches) >= limit:
+        lines.append(f"(showing the first {limit} matches)")
+    return "\n".join(lines)
+
+
+def grep_files(path, pattern, is_regex=False, case_sensitive=False, extensions=None,
+               max_size_mb=GREP_MAX_SIZE_MB, recursive=True, max_matches=GREP_MAX_MATCHES):
+    """Search file contents and return matching lines with line numbers."""
     import re
-    
+    from utils.content_search import search_contents
+
+    if not os.path.exists(path):
+        return(f"'{path}' does not exist.")
     try:
-        # Parse different date filter formats
-        if date_filter.startswith('>=') or date_filter.startswith('after:'):
-            # Files modified on or after a specific date
-            date_str = date_filter.replace('>=', '').replace('after:', '').strip()
-            target_date = datetime.strptime(date_str, '%Y-%m-%d')
-            target_timestamp = target_date.timestamp()
-            return [f for f in file_infos if f["modified"] and f["modified"] >= target_timestamp]
-            
-        elif date_filter.startswith('<=') or date_filter.startswith('before:'):
-            # Files modified on or before a specific date
-            date_str = date_filter.replace('<=', '').replace('before:', '').strip()
-            target_date = datetime.strptime(date_str, '%Y-%m-%d')
-            # Add 24 hours to include the entire day
-            target_date = target_date.replace(hour=23, minute=59, second=59)
-            target_timestamp = target_date.timestamp()
-            return [f for f in file_infos if f["modified"] and f["modified"] <= target_timestamp]
-            
-        elif date_filter.lower() == 'today':
-            # Files modified today
-            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            today_timestamp = today.timestamp()
-            tomorrow_timestamp = (today + timedelta(days=1)).timestamp()
-            return [f for f in file_infos if f["modified"] and today_timestamp <= f["modified"] < tomorrow_timestamp]
-            
-        elif date_filter.lower() == 'yesterday':
-            # Files modified yesterday
-            yesterday = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
-            yesterday_timestamp = yesterday.timestamp()
-            today_timestamp = (yesterday + timedelta(days=1)).timestamp()
-            return [f for f in file_infos if f["modified"] and yesterday_timestamp <= f["modified"] < today_timestamp]
-            
-        elif date_filter.lower().startswith('last'):
-            # Handle "last 7 days", "last week", "last month", etc.
-            if 'days' in date_filter.lower():
-                days_match = re.search(r'(\d+)', date_filter)
-                if days_match:
-                    days = int(days_match.group(1))
-                    cutoff_date = datetime.now() - timedelta(days=days)
-                    cutoff_timestamp = cutoff_date.timestamp()
-                    return [f for f in file_infos if f["modified"] and f["modified"] >= cutoff_timestamp]
-            elif 'week' in date_filter.lower():
-                cutoff_date = datetime.now() - timedelta(weeks=1)
-                cutoff_timestamp = cutoff_date.timestamp()
-                return [f for f in file_infos if f["modified"] and f["modified"] >= cutoff_timestamp]
-            elif 'month' in date_filter.lower():
-                cutoff_date = datetime.now() - timedelta(days=30)
-                cutoff_timestamp = cutoff_date.timestamp()
-                return [f for f in file_infos if f["modified"] and f["modified"] >= cutoff_timestamp]
-                
-        else:
-            # Exact date match (YYYY-MM-DD format)
-            target_date = datetime.strptime(date_filter, '%Y-%m-%d')
-            start_timestamp = target_date.timestamp()
-            end_timestamp = (target_date + timedelta(days=1)).timestamp()
-            return [f for f in file_infos if f["modified"] and start_timestamp <= f["modified"] < end_timestamp]
-            
-    except ValueError:
-        # Invalid date format
-        return None
+        found = search_contents(
+            path, pattern, is_regex=is_regex, case_sensitive=case_sensitive, extensions=extensions,
+            max_size=int(float(max_size_mb) * 1024 * 1024) if max_size_mb else None,
+            recursive=recursive, max_matches=max(1, int(max_matches)), max_files=GREP_MAX_FILES,
+        )
+    except re.error as e:
+        return(f"Invalid regular expression '{pattern}': {e}")
+
+    results = found["results"]
+    if not results:
+        return(f"No matches for '{pattern}' in {found['files_searched']} files searched under '{path}'.")
+    lines = [f"Matches for '{pattern}' in {len(results)} of {found['files_searched']} files searched under '{path}':"]
+    for file_path, matches, truncated in results:
+        lines.append(file_path)
+        lines.extend(f"  {line_number}: {line}" for line_number, line in matches)
+        if truncated:
+            lines.append("  ... more matches in this file")
+    if found["stopped_early"]:
+        lines.append(f"(stopped after {GREP_MAX_FILES} files with matches; narrow the path or pattern to see others)")
+    return "\n".join(lines)
+
+
+def detect_encoding(sample):
+    """Pick an encoding from a prefix sample: a BOM, else UTF-8 if the sample decodes, else cp1252."""
+    import codecs
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith(codecs.BOM_UTF16_LE) or sample.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16"
+    try:
+        # Incremental decoding tolerates a character cut off at the end of the sample
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def count_lines(path):
+    """Count the lines of a file by reading it in blocks."""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(LINE_COUNT_BLOCK), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return lines + (last != b"\n")
+
+
+def read_lines(path, encoding, start_line, end_line, budget):
+    """Read lines start_line..end_line (1-based, inclusive) without loading the rest of the file."""
+    import itertools
+
+    collected = []
+    used = 0
+    last_line = start_line - 1
+    with open(path, "r", encoding=encoding, errors="replace", newline="") as file:
+        stop = end_line if end_line is not None else None
+        for line in itertools.islice(file, start_line - 1, stop):
+            if used + len(line) > budget and collected:
+                return "".join(collected), last_line, True
+            collected.append(line[:budget])
+            used += len(line)
+            last_line += 1
+    return "".join(collected), last_line, False
+
+
+def read_file(path, start_line=None, end_line=None, offset=None, length=None, token_budget=READ_TOKEN_BUDGET):
+    """Read a file, a line range or a byte range, keeping the result within a token budget.
+
+    The encoding is chosen once from a prefix sample. A full read of a file
+    over the budget returns its first and last lines plus the total line
+    count, so the model can ask for the part it needs.
+    """
+    budget = max(1, int(token_budget)) * CHARS_PER_TOKEN
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        encoding = detect_encoding(file.read(ENCODING_SAMPLE_SIZE))
+
+    if start_line is not None or end_line is not None:
+        start_line = max(1, int(start_line or 1))
+        end_line = int(end_line) if end_line is not None else None
+        if end_line is not None and end_line < start_line:
+            return(f"Invalid line range: end_line {end_line} is before start_line {start_line}.")
+        content, last_line, cut = read_lines(path, encoding, start_line, end_line, budget)
+        if not content:
+            return(f"{path} has no lines from line {start_line}.")
+        note = f"\n... (stopped at line {last_line} to stay within the read budget)" if cut else ""
+        return(f"Content of {path} (lines {start_line}-{last_line}):\n{content}{note}")
+
+    if offset is not None or length is not None:
+        offset = max(0, int(offset or 0))
+        length = min(int(length), budget) if length is not None else budget
+        with open(path, "rb") as file:
+            file.seek(offset)
+            data = file.read(length)
+        if encoding.startswith("utf-8"):
+            # Skip continuation bytes so a range starting mid-character decodes cleanly
+            skip = 0
+            while skip < min(3, len(data)) and data[skip] & 0xC0 == 0x80:
+                skip += 1
+            data = data[skip:]
+            offset += skip
+        text = data.decode(encoding, errors="replace")
+        return(f"Content of {path} (bytes {offset}-{offset + len(data)} of {size}):\n{text}")
+
+    if size <= budget:
+        with open(path, "r", encoding=encoding, errors="replace", newline="") as file:
+            return(f"Content of {path}:" f"\n{file.read()}")
+
+    # Too large for the budget: show the head and tail, cut at line boundaries
+    half = budget // 2
+    with open(path, "rb") as file:
+        head = file.read(half)
+        file.seek(max(size - half, len(head)))
+        tail = file.read()
+    head = head[:head.rfind(b"\n") + 1] or head
+    tail = tail[tail.find(b"\n") + 1:] or tail
+    total_lines = count_lines(path)
+    head_lines = head.count(b"\n")
+    tail_lines = tail.count(b"\n") + (not tail.endswith(b"\n"))
+    return (
+        f"{path} is {size} bytes ({total_lines} lines), more than the read budget of about "
+        f"{token_budget} tokens. Showing lines 1-{head_lines} and {total_lines - tail_lines + 1}-{total_lines}; "
+        f"use start_line/end_line or offset/length to read other parts.\n"
+        f"{head.decode(encoding, errors='replace')}"
+        f"\n... ({total_lines - head_lines - tail_lines} lines omitted) ...\n"
+        f"{tail.decode(encoding, errors='replace')}"
+    )
+
+
+def notify_changed(*paths):
+    """Report paths this module created, changed or removed to the directory
+    watcher (and through it the file index), so listings and searches see
+    the change at once. Never fails the action itself."""
+    watcher = get_directory_watcher()
+    for path in paths:
+        if path is None:
+            continue
+        try:
+            watcher.apply_change(path)
+        except Exception as e:
+            print(f"Warning: Could not record the change to {path}: {e}")
+
+
+def describe_transfer(result):
+    """Summary of a copy: amount, time, throughput, resumed data and failures."""
+    from utils.copy_engine import format_size
+
+    seconds = max(result["seconds"], 1e-3)
+    files = f"{result['files']} files, " if result["files"] != 1 else ""
+    text = (f" ({files}{format_size(result['bytes'])} in {seconds:.1f} s, "
+            f"{format_size(result['bytes'] / seconds)}/s")
+    if result["resumed"]:
+        text += f", resumed after {format_size(result['resumed'])} already copied"
+    text += ")"
+    if result["errors"]:
+        failed = "; ".join(f"{path}: {message}" for path, message in result["errors"][:5])
+        text += f". {len(result['errors'])} could not be copied: {failed}"
+    return text
+
+
+def natural_sort_key(path):
+    """Sort key that orders 'photo2' before 'photo10'."""
+    import re
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', path)]
+
+
+def resolve_batch_paths(paths=None, glob_pattern=None):
+    """Targets of a batch action: explicit paths followed by glob matches (in natural order), without duplicates."""
+    import glob
+
+    targets = list(paths or [])
+    if glob_pattern:
+        targets.extend(sorted(glob.glob(os.path.expanduser(glob_pattern), recursive=True), key=natural_sort_key))
+    return list(dict.fromkeys(targets))
+
+
+def render_rename_template(template, path, number):
+    """New name for path from a template with {name}, {ext}, {n}, {parent} and {date} fields."""
+    from datetime import datetime
+
+    name, ext = os.path.splitext(os.path.basename(path))
+    try:
+        modified = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d')
+    except OSError:
+        modified = ""
+    return template.format(name=name, ext=ext, n=number, parent=os.path.basename(os.path.dirname(path)),
+                           date=modified)
+
+
+def plan_batch_rename(targets, template, start_number=1):
+    """Map each target to its new path, or return an error message if the names collide."""
+    plan = []
+    for number, path in enumerate(targets, start=start_number):
+        new_name = render_rename_template(template, path, number)
+        if not new_name or os.sep in new_name or (os.altsep and os.altsep in new_name):
+            return None, f"Template '{template}' produced an invalid name '{new_name}' for {path}."
+        plan.append((path, os.path.join(os.path.dirname(path), new_name)))
+
+    sources = {os.path.normcase(os.path.abspath(path)) for path, _ in plan}
+    seen = set()
+    for path, new_path in plan:
+        key = os.path.normcase(os.path.abspath(new_path))
+        if key in seen:
+            return None, f"Template '{template}' gives several files the name '{os.path.basename(new_path)}'."
+        seen.add(key)
+        if os.path.exists(new_path) and key not in sources:
+            return None, f"'{new_path}' already exists; nothing was renamed."
+    return plan, None
+
+
+def run_batch(operation, args):
+    """Apply one file operation to many paths in a single call and summarize the outcome.
+
+    Targets come from 'paths' and/or a 'glob' pattern. Returns one summary,
+    so a bulk change costs one model turn instead of one per file.
+    """
+    targets = resolve_batch_paths(args.get("paths", None), args.get("glob", None))
+    if not targets:
+        return("No paths matched for the batch operation.")
+    if len(targets) > BATCH_LIMIT:
+        return(f"The batch matches {len(targets)} paths, more than the limit of {BATCH_LIMIT}. "
+               f"Narrow the paths or glob pattern.")
+
+    done = []  # (path, detail) of successful changes
+    failed = []  # (path, error)
+
+    if operation == "rename":
+        template = args.get("rename_template", None)
+        if not template:
+            return("No rename_template provided for batch renaming.")
+        try:
+            plan, error = plan_batch_rename(targets, template, int(args.get("start_number", 1)))
+        except (KeyError, IndexError, ValueError) as e:
+            return(f"Invalid rename_template '{template}': {e}. Use {{name}}, {{ext}}, {{n}}, {{parent}} or {{date}}.")
+        if error:
+            return(error)
+        # Rename through temporary names first when a new name is another file's current name
+        renames = [(path, new_path) for path, new_path in plan if path != new_path]
+        staged = []
+        for index, (path, new_path) in enumerate(renames):
+            temp_path = os.path.join(os.path.dirname(path), f".batch-rename-{os.getpid()}-{index}")
+            try:
+                os.rename(path, temp_path)
+                staged.append((path, temp_path, new_path))
+            except OSError as e:
+                failed.append((path, str(e)))
+        for path, temp_path, new_path in staged:
+            try:
+                os.rename(temp_path, new_path)
+                notify_changed(path, new_path)
+                done.append((path, f"-> {os.path.basename(new_path)}"))
+            except OSError as e:
+                try:
+                    os.rename(temp_path, path)
+                except OSError:
+                    pass
+                failed.append((path, str(e)))
+        verb = "Renamed"
+
+    elif operation in ("copy", "move"):
+        destination = args.get("destination_path", None)
+        if destination is None:
+            return(f"No destination_path provided for batch {operation}.")
+        if not os.path.isdir(destination):
+            return(f"Destination '{destination}' is not a directory.")
+        transfer = copy_path if operation == "copy" else move_path
+        for path in targets:
+            try:
+                result = transfer(path, destination)
+                notify_changed(result["destination"], path if operation == "move" else None)
+                if result["errors"]:
+                    failed.append((path, result["errors"][0][1]))
+                else:
+                    done.append((path, f"-> {result['destination']}"))
+            except (OSError, ValueError) as e:
+                failed.append((path, str(e)))
+        verb = "Copied" if operation == "copy" else "Moved"
+
+    elif operation == "delete":
+        for path in targets:
+            if os.path.isdir(path) and not os.path.islink(path):
+                failed.append((path, "is a directory (only files are deleted in batches)"))
+                continue
+            try:
+                os.remove(path)
+                notify_changed(path)
+                done.append((path, ""))
+            except OSError as e:
+                failed.append((path, str(e)))
+        verb = "Deleted"
+
+    elif operation in ("create", "write"):
+        contents = args.get("contents", None)
+        content = args.get("content", "" if operation == "create" else None)
+        if operation == "write" and contents is None and content is None:
+            return("No content or contents provided for batch writing.")
+        if contents is not None and len(contents) != len(targets):
+            return(f"Got {len(contents)} contents for {len(targets)} paths; provide one per path.")
+        for index, path in enumerate(targets):
+            text = contents[index] if contents is not None else content
+            try:
+                with open(path, "w", encoding="utf-8") as file:
+                    file.write(text)
+                notify_changed(path)
+                done.append((path, ""))
+            except OSError as e:
+                failed.append((path, str(e)))
+        verb = "Created" if operation == "create" else "Wrote"
+
+    else:
+        return(f"Batch action '{operation}' not recognized. Use batchCreate, batchWrite, batchDelete, "
+               f"batchCopy, batchMove or batchRename.")
+
+    lines = [f"{verb} {len(done)} of {len(targets)} paths."]
+    for path, detail in done[:BATCH_REPORT_LINES]:
+        lines.append(f"- {path} {detail}".rstrip())
+    if len(done) > BATCH_REPORT_LINES:
+        lines.append(f"- ... and {len(done) - BATCH_REPORT_LINES} more")
+    if failed:
+        lines.append(f"Failed for {len(failed)}:")
+        lines.extend(f"- {path}: {error}" for path, error in failed[:BATCH_REPORT_LINES])
+        if len(failed) > BATCH_REPORT_LINES:
+            lines.append(f"- ... and {len(failed) - BATCH_REPORT_LINES} more")
+    return "\n".join(lines)
 
 
 def execute(args):
@@ -288,6 +753,9 @@ def execute(args):
     
     command = args.get("action", None).lower()  # Convert command to lowercase for case-insensitive matching
 
+    # Batch actions first, since their names contain the single-file action names
+    if command.startswith("batch"):
+        return run_batch(command[len("batch"):], args)
 
     if "createdir" in command:
         path = args.get("path", None)  # Get the path from the arguments
@@ -296,6 +764,7 @@ def execute(args):
         try:
             # Create the directory
             os.makedirs(path)
+            notify_changed(path)
             return(f"Directory created at: {path}")
         except FileExistsError:
             return(f"Error: Directory '{path}' already exists.")
@@ -314,7 +783,9 @@ def execute(args):
         if not content:
             return("No content provided for PDF creation.")
         
-        return create_pdf(path, content, title)
+        result = create_pdf(path, content, title)
+        notify_changed(document_path(path, "pdf"))
+        return result
 
     elif "createdoc" in command:
         path = args.get("path", None)
@@ -326,7 +797,9 @@ def execute(args):
         if not content:
             return("No content provided for document creation.")
         
-        return create_document(path, content, doc_type)
+        result = create_document(path, content, doc_type)
+        notify_changed(document_path(path, doc_type))
+        return result
 
     elif "create" in command:
         path = args.get("path", None)  # Get the path from the arguments
@@ -335,6 +808,7 @@ def execute(args):
             return
         # Create the file
         open(f"{path}", "w").close()
+        notify_changed(path)
         return(f"File created at {path}.")
         
     elif "write" in command:
@@ -348,27 +822,28 @@ def execute(args):
         # Write the content to the file
         with open(f"{path}", "w") as file:
             file.write(content)
+        notify_changed(path)
         return(f"Content written to {path}.")
 
     elif "read" in command:
         path = args.get("path", None)  # Get the path from the arguments
         if path is None:
             return("No path provided for file reading.")
-            return
-        # Read the content of the file with proper encoding handling
         try:
-            with open(f"{path}", "r", encoding="utf-8") as file:
-                content = file.read()
-        except UnicodeDecodeError:
-            # Try with different encoding if UTF-8 fails
-            try:
-                with open(f"{path}", "r", encoding="cp1252") as file:
-                    content = file.read()
-            except UnicodeDecodeError:
-                # If both fail, read as binary and decode with error handling
-                with open(f"{path}", "rb") as file:
-                    content = file.read().decode("utf-8", errors="replace")
-        return(f"Content of {path}:" f"\n{content}")
+            return read_file(
+                path,
+                start_line=args.get("start_line", None),
+                end_line=args.get("end_line", None),
+                offset=args.get("offset", None),
+                length=args.get("length", None),
+                token_budget=args.get("max_tokens", READ_TOKEN_BUDGET),
+            )
+        except FileNotFoundError:
+            return(f"Error: File '{path}' not found.")
+        except PermissionError:
+            return(f"Error: Permission denied to read file '{path}'.")
+        except (TypeError, ValueError) as e:
+            return(f"Invalid read range: {e}")
 
     elif "delete" in command:
        path = args.get("path", None)  # Get the path from the arguments
@@ -381,6 +856,7 @@ def execute(args):
             return(f"Error: File '{path}' not found.")
        except PermissionError:
             return(f"Error: Permission denied to delete file '{path}'.")
+       notify_changed(path)
        return(f"File deleted from {path}.")
 
     elif "copy" in command:
@@ -388,16 +864,38 @@ def execute(args):
         dest_path = args.get("destination_path", None)  # Get the destination path from the arguments
         if source_path is None or dest_path is None:
             return("Source or destination path not provided for file copying.")
-        # Copy the file
-        shutil.copy(f"{source_path}", f"{dest_path}")
-        return(f"File copied from {source_path} to {dest_path}.")
+        # Copy the file or directory tree
+        try:
+            result = copy_path(source_path, dest_path)
+        except FileNotFoundError as e:
+            return(f"Error: '{e.filename}' not found.")
+        except PermissionError as e:
+            return(f"Error: Permission denied for '{e.filename}'.")
+        except (OSError, ValueError) as e:
+            return(f"Error copying '{source_path}': {e}")
+        notify_changed(result["destination"])
+        return(f"Copied from {source_path} to {result['destination']}{describe_transfer(result)}.")
     elif "move" in command:
         source_path = args.get("source_path", None)
         dest_path = args.get("destination_path", None)
         if source_path is None or dest_path is None:
-            return("Source or destination path not provided for file moving.")        # Move the file
-        shutil.move(f"{source_path}", f"{dest_path}")
-        return(f"File moved from {source_path} to {dest_path}.")
+            return("Source or destination path not provided for file moving.")
+        # Move the file: a rename on the same drive, otherwise a copy with progress
+        try:
+            result = move_path(source_path, dest_path)
+        except FileNotFoundError as e:
+            return(f"Error: '{e.filename}' not found.")
+        except PermissionError as e:
+            return(f"Error: Permission denied for '{e.filename}'.")
+        except (OSError, ValueError) as e:
+            return(f"Error moving '{source_path}': {e}")
+        notify_changed(source_path, result["destination"])
+        if result["renamed"]:
+            return(f"Moved from {source_path} to {result['destination']}.")
+        if result["errors"]:
+            return(f"Copied {source_path} to {result['destination']}{describe_transfer(result)}, "
+                   f"but kept the source because some files failed.")
+        return(f"Moved from {source_path} to {result['destination']}{describe_transfer(result)}.")
     elif "rename" in command:
         path =  args.get("path", None)  # Get the path from the arguments
         old_name =  args.get("old_name", None)  # Get the old name from the arguments
@@ -406,95 +904,88 @@ def execute(args):
             return("Path, old name or new name not provided for file renaming.")
         # Rename the file
         os.rename(f"{path}/{old_name}", f"{path}/{new_name}")
+        notify_changed(f"{path}/{old_name}", f"{path}/{new_name}")
         return(f"File {old_name} renamed to {new_name} in {path}.")
     elif "list" in command:
-        # Extract the path from the command
+        # Extract the path(s) from the command
         path = args.get("path", None)
+        paths = list(args.get("paths", None) or [])  # Extra directories listed together with path
+        if path and path not in paths:
+            paths.insert(0, path)
         date_filter = args.get("date_filter", None)  # Optional date filter
         show_details = args.get("show_details", True)  # Show creation/modification times
+        recursive = args.get("recursive", False)  # Include subdirectories
+        limit = args.get("limit", None)  # Only the N most recently modified entries
         
-        if path is None:
+        if not paths:
             return("No path provided for listing files.")
-        if not os.path.isdir(path):
-            return(f"'{path}' is not a valid directory.")
+        for list_path in paths:
+            if not os.path.isdir(list_path):
+                return(f"'{list_path}' is not a valid directory.")
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except (TypeError, ValueError):
+                return("Limit must be a positive number.")
+            if limit <= 0:
+                return("Limit must be a positive number.")
 
         try:
-            from datetime import datetime, timedelta
-            import re
-            
-            files = os.listdir(path)
-            total_files = len(files)
-            
             # Parse date filter once if provided
             filter_criteria = None
             if date_filter:
                 filter_criteria = parse_date_filter(date_filter)
                 if filter_criteria is None:
                     return("Invalid date format. Please use YYYY-MM-DD format (e.g., 2025-07-23).")
+
+            # Trees come from the file index's mtime index; several directories are merged
+            if recursive or len(paths) > 1:
+                return list_newest_files(paths, date_filter, filter_criteria, recursive, limit)
+            path = paths[0]
             
-            # Gather file info with smart filtering
+            # Directory metadata comes from the watcher: scanned once, then kept
+            # up to date in memory from change events
+            entries = get_directory_watcher().listing(path)
+            total_files = len(entries)
             file_infos = []
-            files_processed = 0
             matching_files = 0
             
-            for file in files:
-                file_path = os.path.join(path, file)
-                try:
-                    modified = os.path.getmtime(file_path)
-                    is_dir = os.path.isdir(file_path)
-                    
+            for info in entries:
+                # Entries whose info could not be read are still included
+                if info["modified"] is not None:
                     # If we have a date filter, check it immediately
-                    if filter_criteria and not check_date_match(modified, filter_criteria):
+                    if filter_criteria and not check_date_match(info["modified"], filter_criteria):
                         continue  # Skip files that don't match date filter
-                    
-                    # File matches criteria, gather full info
-                    if show_details:
-                        created = os.path.getctime(file_path)
-                        file_infos.append({
-                            "name": file,
-                            "created": created,
-                            "modified": modified,
-                            "is_dir": is_dir
-                        })
-                    else:
-                        file_infos.append({
-                            "name": file,
-                            "created": None,
-                            "modified": modified,
-                            "is_dir": is_dir
-                        })
-                    
                     matching_files += 1
-                        
-                except Exception as e:
-                    # If we can't get file info, still include it
-                    file_infos.append({
-                        "name": file,
-                        "created": None,
-                        "modified": None,
-                        "is_dir": False
-                    })
-
-            # Sort by modified time, newest first (directories first)
-            file_infos.sort(key=lambda x: (not x["is_dir"], -(x["modified"] if x["modified"] is not None else 0)))
+                if not show_details:
+                    info["created"] = None
+                file_infos.append(info)
+
+            # Newest first, directories first; a limit only keeps the top N instead of sorting everything
+            sort_key = lambda x: (x["is_dir"], x["modified"] if x["modified"] is not None else 0)
+            if limit is not None:
+                file_infos = heapq.nlargest(limit, file_infos, key=sort_key)
+            else:
+                file_infos.sort(key=sort_key, reverse=True)
 
             filter_text = f" (filtered by {date_filter})" if date_filter else ""
             result_lines = [f"Files in {path}{filter_text} (newest to oldest):"]
             
             if date_filter and matching_files < total_files:
                 result_lines.append(f"Found {matching_files} files matching criteria out of {total_files} total files.")
+            if limit is not None and len(file_infos) < matching_files:
+                result_lines.append(f"Showing the {len(file_infos)} most recent.")
             
             if not file_infos:
                 result_lines.append("No files found matching the criteria.")
             else:
                 for info in file_infos:
                     file_type = "[DIR]" if info["is_dir"] else "[FILE]"
+                    modified_str = format_timestamp(info["modified"])
                     if show_details and info["created"] is not None:
-                        created_str = datetime.fromtimestamp(info["created"]).strftime('%Y-%m-%d %H:%M:%S')
-                        modified_str = datetime.fromtimestamp(info["modified"]).strftime('%Y-%m-%d %H:%M:%S') if info["modified"] else "Unknown"
+                        created_str = format_timestamp(info["created"])
                         result_lines.append(f"- {file_type} {info['name']} (modified: {modified_str}, created: {created_str})")
                     else:
-                        modified_str = datetime.fromtimestamp(info["modified"]).strftime('%Y-%m-%d %H:%M:%S') if info["modified"] else "Unknown"
                         result_lines.append(f"- {file_type} {info['name']} (modified: {modified_str})")
             
             return "\n".join(result_lines)
@@ -504,19 +995,29 @@ def execute(args):
         except Exception as e:
             return(f"Error listing files: {str(e)}")
 
+    elif "grep" in command:
+        path = args.get("path", None)
+        pattern = args.get("pattern", None)
+        if path is None or not pattern:
+            return("Path or pattern not provided for content search.")
+        return grep_files(
+            path, pattern,
+            is_regex=args.get("regex", False),
+            case_sensitive=args.get("case_sensitive", False),
+            extensions=args.get("extensions", None),
+            max_size_mb=args.get("max_size_mb", GREP_MAX_SIZE_MB),
+            recursive=args.get("recursive", True),
+            max_matches=args.get("max_matches", GREP_MAX_MATCHES),
+        )
+
     elif "search" in command:
         # Extract the path and file name from the command
         path = args.get("path", None)
         file_name = args.get("file_name", None)
+        match = str(args.get("match", "exact")).lower()
         if path is None or file_name is None:
             return("Path or file name not provided for file searching.")
-        # Search for the file in the directory, and its subdirectories
-        # return the path of the file if found or a message if not found
-        for root, dirs, files in os.walk(path):
-            if file_name in files:
-                return(f"File found at: {os.path.join(root, file_name)}")
-        else:
-            return(f"File '{file_name}' not found in '{path}' or its subdirectories.")
+        return search_files(path, file_name, match)
     else:
         return("Files command not recognized.")
 
@@ -1,21 +1,38 @@
 # This module is used to send emails through Gmail using the Gmail API.
 #Command: gmail send [to] [subject] [body]
-#Command: gmail send_with_attachment [to] [subject] [body] [attachment_path]
+#Command: gmail send_with_attachment [to] [subject] [body] [attachment_path] [attachment_paths]
 #Command: gmail get [count] - Get the last (count) emails
+#Command: gmail search [query] [count] - Search the local mail cache
 
 import os
 import base64
 import mimetypes
+import html
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import email.policy
+from datetime import datetime, timezone
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
-from email import encoders
+from google.auth.exceptions import RefreshError, TransportError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
 from dotenv import load_dotenv
+from utils.mail_cache import get_mail_cache
+
+# Sending mail has side effects; reading may run concurrently
+SEQUENTIAL_ACTIONS = {"send", "send_with_attachment"}
+
+# Actions that can answer from the local mail cache when Gmail can't be reached
+CACHE_ACTIONS = {"get", "get_by_id", "get_id", "search"}
 
 # --- Environment Setup ---
 load_dotenv()
@@ -25,75 +42,195 @@ load_dotenv()
 # delete src/utils/gmail_token.json to force re-authentication with new permissions.
 SCOPES = ['https://www.googleapis.com/auth/gmail.send', 'https://www.googleapis.com/auth/gmail.readonly']
 
-def authenticate_gmail():
-    """Authenticate and return Gmail service object."""
-    creds = None
+BATCH_SIZE = 50  # messages.get calls per batch request (Gmail allows 100 but throttles large batches)
+BATCH_RETRIES = 2  # Extra batches for calls that were throttled or hit a server error
+BATCH_RETRY_DELAY = 1  # Seconds before the first retry batch; doubles after that
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+PREVIEW_HEADERS = ['Subject', 'From', 'Date']
+SYNC_HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+ENCODE_CHUNK_SIZE = 57 * 4096  # Multiple of 57 bytes, so every base64 line is full
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # Resumable upload chunks must be multiples of 256 KiB
+MAX_UPLOAD_SIZE = 35 * 1024 * 1024  # Gmail's limit for messages sent through media upload
+
+TOKEN_FILE = 'src/utils/gmail_token.json'
+CREDENTIALS_FILE = 'src/utils/gmail_credentials.json'
+TOKEN_REFRESH_MARGIN = 300  # Refresh the access token when it expires within this many seconds
+
+# Credentials are shared; services are built once per thread because the
+# underlying httplib2 connection is not thread-safe.
+_creds = None
+_creds_lock = threading.Lock()
+_services = threading.local()
+
+
+def _needs_refresh(creds):
+    """Whether the credentials are invalid or close to expiring."""
+    if not creds.valid:
+        return True
+    if creds.expiry is None:
+        return False
+    now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth uses naive UTC
+    return (creds.expiry - now).total_seconds() < TOKEN_REFRESH_MARGIN
+
+
+def _get_credentials():
+    """Return cached credentials, loading, refreshing or creating them only when needed."""
+    global _creds
+    creds = _creds
+    if creds is not None and not _needs_refresh(creds):
+        return creds, None
+
     # The file token.json stores the user's access and refresh tokens.
-    if os.path.exists('src/utils/gmail_token.json'):
-        creds = Credentials.from_authorized_user_file('src/utils/gmail_token.json', SCOPES)
+    if creds is None and os.path.exists(TOKEN_FILE):
+        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
     
     # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+    if not creds or _needs_refresh(creds):
+        if creds and creds.refresh_token:
+            try:
+                creds.refresh(Request())
+            except (RefreshError, TransportError) as e:
+                # Offline or revoked: cache-backed actions can still run without a service
+                return None, f"Could not refresh Gmail credentials: {str(e)}"
         else:
             # You need to download credentials.json from Google Cloud Console
-            if os.path.exists('src/utils/gmail_credentials.json'):
+            if os.path.exists(CREDENTIALS_FILE):
                 flow = InstalledAppFlow.from_client_secrets_file(
-                    'src/utils/gmail_credentials.json', SCOPES)
+                    CREDENTIALS_FILE, SCOPES)
                 creds = flow.run_local_server(port=0)
             else:
                 return None, "gmail_credentials.json file not found. Please download it from Google Cloud Console."
 
         # Save the credentials for the next run
-        with open('src/utils/gmail_token.json', 'w') as token:
+        with open(TOKEN_FILE, 'w') as token:
             token.write(creds.to_json())
+
+    _creds = creds
+    return creds, None
+
+
+def reset_gmail_service():
+    """Drop cached credentials and services, e.g. after the token file was deleted."""
+    global _creds, _services
+    with _creds_lock:
+        _creds = None
+        _services = threading.local()
+
+
+def authenticate_gmail():
+    """Authenticate and return Gmail service object.
+
+    The service is built once per thread and reused; credentials are
+    refreshed in place when they are about to expire, so existing services
+    keep working without being rebuilt.
+    """
+    with _creds_lock:
+        creds, error = _get_credentials()
+    if error:
+        return None, error
+
+    service = getattr(_services, 'service', None)
+    if service is not None and getattr(_services, 'creds', None) is creds:
+        return service, None
     
     try:
-        service = build('gmail', 'v1', credentials=creds)
-        return service, None
+        service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
     except Exception as e:
         return None, f"Failed to build Gmail service: {str(e)}"
+    _services.service = service
+    _services.creds = creds
+    return service, None
 
-def create_message(to, subject, body, attachment_path=None):
-    """Create a message for an email."""
-    if attachment_path:
-        message = MIMEMultipart()
-    else:
-        message = MIMEText(body)
-        message['to'] = to
-        message['subject'] = subject
-        return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
-    
+def create_message(to, subject, body):
+    """Create a plain-text message for an email."""
+    message = MIMEText(body)
     message['to'] = to
     message['subject'] = subject
-    
-    # Add body
-    message.attach(MIMEText(body, 'plain'))
-    
-    # Add attachment if provided
-    if attachment_path and os.path.exists(attachment_path):
+    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
+
+def _write_base64(source, target):
+    """Base64-encode a file into another in fixed-size chunks (76-char CRLF lines)."""
+    while True:
+        chunk = source.read(ENCODE_CHUNK_SIZE)
+        if not chunk:
+            break
+        target.write(base64.encodebytes(chunk).replace(b'\n', b'\r\n'))
+
+def write_mime_message(target, to, subject, body, attachment_paths):
+    """Write a multipart RFC 822 message with attachments to a binary file object.
+
+    Attachments are streamed from disk and encoded chunk by chunk, so memory
+    use does not depend on attachment size.
+    """
+    boundary = f"=============== {uuid.uuid4().hex} =="
+    envelope = MIMEMultipart('mixed', boundary=boundary)
+    envelope['to'] = to
+    envelope['subject'] = subject
+    target.write(_headers_bytes(envelope))
+
+    text_part = MIMEText(body, 'plain', 'utf-8')
+    del text_part['MIME-Version']
+    target.write(f"--{boundary}\r\n".encode())
+    target.write(text_part.as_bytes(policy=email.policy.SMTP))
+    target.write(b"\r\n")
+
+    for attachment_path in attachment_paths:
         content_type, encoding = mimetypes.guess_type(attachment_path)
-        
         if content_type is None or encoding is not None:
             content_type = 'application/octet-stream'
-        
         main_type, sub_type = content_type.split('/', 1)
-        
-        with open(attachment_path, 'rb') as fp:
-            attachment = MIMEBase(main_type, sub_type)
-            attachment.set_payload(fp.read())
-        
-        encoders.encode_base64(attachment)
-        
-        filename = os.path.basename(attachment_path)
-        attachment.add_header(
-            'Content-Disposition',
-            f'attachment; filename= {filename}',
-        )
-        message.attach(attachment)
-    
-    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
+
+        part = MIMEBase(main_type, sub_type)
+        del part['MIME-Version']
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(attachment_path))
+
+        target.write(f"--{boundary}\r\n".encode())
+        target.write(_headers_bytes(part))
+        with open(attachment_path, 'rb') as source:
+            _write_base64(source, target)
+
+    target.write(f"--{boundary}--\r\n".encode())
+
+def _headers_bytes(message):
+    """Serialize only the headers of a MIME object, followed by the blank separator line."""
+    header_policy = email.policy.compat32.clone(linesep='\r\n')  # Encodes non-ASCII values like as_bytes() does
+    return b"".join(header_policy.fold_binary(name, value) for name, value in message.items()) + b"\r\n"
+
+def send_message_with_attachments(service, to, subject, body, attachment_paths):
+    """Send an email with attachments through Gmail's resumable media upload.
+
+    The message is written to a temporary file and uploaded in chunks, so
+    neither the attachments nor the encoded message are held in memory.
+    """
+    total_size = sum(os.path.getsize(path) for path in attachment_paths)
+    if total_size * 4 / 3 > MAX_UPLOAD_SIZE:
+        return (f"Attachments are too large to send ({total_size / 1024 / 1024:.1f} MB); "
+                f"Gmail accepts up to about {MAX_UPLOAD_SIZE * 3 / 4 / 1024 / 1024:.0f} MB "
+                f"({MAX_UPLOAD_SIZE // 1024 // 1024} MB once encoded).")
+
+    temp_file = tempfile.NamedTemporaryFile(suffix='.eml', delete=False)
+    try:
+        with temp_file:
+            write_mime_message(temp_file, to, subject, body, attachment_paths)
+        # The stream is ours to close, so the file can be removed below (Windows
+        # refuses to delete open files)
+        with open(temp_file.name, 'rb') as stream:
+            media = MediaIoBaseUpload(stream, mimetype='message/rfc822', chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+            request = service.users().messages().send(userId='me', body={}, media_body=media)
+            response = None
+            while response is None:
+                _, response = request.next_chunk()
+        return f"Message sent successfully. Message ID: {response['id']}"
+    except HttpError as error:
+        return f"An error occurred: {error}"
+    except Exception as e:
+        return f"Failed to send message: {str(e)}"
+    finally:
+        try:
+            os.remove(temp_file.name)
+        except OSError as e:
+            print(f"Warning: Could not remove temporary message file {temp_file.name}: {e}")
 
 def send_message(service, message):
     """Send an email message."""
@@ -105,8 +242,54 @@ def send_message(service, message):
     except Exception as e:
         return f"Failed to send message: {str(e)}"
 
-def get_emails(service, count=10):
-    """Get the last (count) emails from the inbox."""
+def fetch_messages(service, message_ids, format='full'):
+    """Fetch several messages using Gmail batch requests.
+
+    Up to BATCH_SIZE messages.get calls travel in one HTTP round trip. Calls
+    that fail inside a batch with a rate-limit or server error are sent again
+    in a later batch, up to BATCH_RETRIES times with a growing delay.
+    Returns the messages in the order of message_ids; messages that failed to
+    fetch are skipped unless every fetch failed.
+    """
+    fetched = {}
+    errors = {}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            fetched[request_id] = response
+
+    extra = {'metadataHeaders': PREVIEW_HEADERS} if format == 'metadata' else {}
+    pending = list(message_ids)
+    for attempt in range(BATCH_RETRIES + 1):
+        if attempt:
+            time.sleep(BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+            for message_id in pending:
+                del errors[message_id]
+        for start in range(0, len(pending), BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_response)
+            for message_id in pending[start:start + BATCH_SIZE]:
+                batch.add(
+                    service.users().messages().get(userId='me', id=message_id, format=format, **extra),
+                    request_id=message_id,
+                )
+            batch.execute()
+        pending = [message_id for message_id, error in errors.items()
+                   if getattr(error, 'status_code', None) in RETRYABLE_STATUSES]
+        if not pending:
+            break
+
+    if errors and not fetched:
+        raise next(iter(errors.values()))
+    return [fetched[message_id] for message_id in message_ids if message_id in fetched]
+
+def get_emails(service, count=10, format='metadata'):
+    """Get the last (count) emails from the inbox.
+
+    The default 'metadata' format fetches only headers and Gmail's snippet,
+    which is all the list preview shows; pass format='full' for bodies.
+    """
     try:
         # Get list of messages from inbox only
         results = service.users().messages().list(userId='me', maxResults=count, labelIds=['INBOX']).execute()
@@ -115,30 +298,190 @@ def get_emails(service, count=10):
         if not messages:
             return "No emails found."
         
-        email_list = []
-        for message in messages:
-            # Get full message details
-            msg = service.users().messages().get(userId='me', id=message['id']).execute()
-            email_data = format_email_data(msg)
-            email_list.append(email_data)
+        message_ids = [message['id'] for message in messages]
+        email_list = [format_email_data(msg) for msg in fetch_messages(service, message_ids, format)]
         
         return format_email_list(email_list)
     
     except HttpError as error:
-        if "insufficientPermissions" in str(error) or "insufficient authentication scopes" in str(error):
-            # Delete the token file to force re-authentication
-            token_path = 'src/utils/gmail_token.json'
-            if os.path.exists(token_path):
-                os.remove(token_path)
-                return ("Insufficient permissions detected. The authentication token has been cleared. "
-                       "Please run the Gmail get command again to re-authenticate with the required permissions.")
-            else:
-                return ("Insufficient permissions. Please ensure you have the required Gmail scopes and "
-                       "re-authenticate by running the command again.")
-        return f"An error occurred while fetching emails: {error}"
+        return describe_fetch_error(error)
     except Exception as e:
         return f"Failed to get emails: {str(e)}"
 
+def describe_fetch_error(error):
+    """Turn an HttpError from a read request into a message, clearing the token on scope errors."""
+    if "insufficientPermissions" in str(error) or "insufficient authentication scopes" in str(error):
+        # Delete the token file to force re-authentication
+        token_path = TOKEN_FILE
+        reset_gmail_service()
+        if os.path.exists(token_path):
+            os.remove(token_path)
+            return ("Insufficient permissions detected. The authentication token has been cleared. "
+                   "Please run the Gmail get command again to re-authenticate with the required permissions.")
+        else:
+            return ("Insufficient permissions. Please ensure you have the required Gmail scopes and "
+                   "re-authenticate by running the command again.")
+    return f"An error occurred while fetching emails: {error}"
+
+def message_to_record(message, full=True):
+    """Convert a Gmail API message resource into a mail cache record."""
+    email = format_email_data(message, truncate=False)
+    return {
+        'id': message['id'],
+        'thread_id': message.get('threadId'),
+        'internal_date': message.get('internalDate'),
+        'label_ids': message.get('labelIds', []),
+        'subject': email['subject'],
+        'sender': email['from'],
+        'date': email['date'],
+        'snippet': html.unescape(message.get('snippet', '')),
+        'body': email['body'] if full else None,
+    }
+
+def record_to_email(record, truncate=True):
+    """Convert a mail cache record into the dict used by the formatters.
+    Search results show the matched snippet ('hit') instead of the body start."""
+    body = record.get('hit') or record.get('body') or record.get('snippet') or "[No body content]"
+    if truncate and len(body) > 200:
+        body = body[:200] + '...'
+    return {
+        'id': record['id'],
+        'subject': record.get('subject') or 'No Subject',
+        'from': record.get('sender') or 'Unknown Sender',
+        'date': record.get('date') or 'Unknown Date',
+        'body': body,
+    }
+
+def _fetch_full_records(service, message_ids):
+    """Fetch full messages as cache records, tolerating messages deleted meanwhile."""
+    if not message_ids:
+        return []
+    try:
+        messages = fetch_messages(service, message_ids, 'full')
+    except HttpError as error:
+        if getattr(error.resp, 'status', None) == 404:
+            return []
+        raise
+    return [message_to_record(msg) for msg in messages]
+
+def _apply_history(service, cache, history_id):
+    """Apply changes since history_id to the cache and store the new historyId."""
+    added, deleted, relabeled = [], set(), {}
+    new_history_id = history_id
+    page_token = None
+    while True:
+        response = service.users().history().list(
+            userId='me', startHistoryId=history_id, historyTypes=SYNC_HISTORY_TYPES, pageToken=page_token
+        ).execute()
+        for record in response.get('history', []):
+            for item in record.get('messagesAdded', []):
+                message_id = item['message']['id']
+                if message_id not in added:
+                    added.append(message_id)
+                deleted.discard(message_id)
+            for item in record.get('messagesDeleted', []):
+                message_id = item['message']['id']
+                deleted.add(message_id)
+                relabeled.pop(message_id, None)
+            for key in ('labelsAdded', 'labelsRemoved'):
+                for item in record.get(key, []):
+                    # labelIds on the message are its labels after the change
+                    relabeled[item['message']['id']] = item['message'].get('labelIds', [])
+        new_history_id = response.get('historyId', new_history_id)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+    added = [message_id for message_id in added if message_id not in deleted]
+    cache.delete_messages(deleted)
+    known = cache.known_ids(added)
+    cache.store_messages(_fetch_full_records(service, [m for m in added if m not in known]))
+    for message_id, label_ids in relabeled.items():
+        if message_id not in deleted:
+            cache.set_labels(message_id, label_ids)
+    cache.set_state('history_id', new_history_id)
+
+def _backfill_inbox(service, cache, count, set_history_id):
+    """Make sure the newest `count` inbox messages are cached."""
+    if set_history_id:
+        # Read the historyId before listing so nothing that arrives meanwhile is missed
+        history_id = service.users().getProfile(userId='me').execute()['historyId']
+    results = service.users().messages().list(userId='me', maxResults=count, labelIds=['INBOX']).execute()
+    message_ids = [message['id'] for message in results.get('messages', [])]
+    known = cache.known_ids(message_ids)
+    cache.store_messages(_fetch_full_records(service, [m for m in message_ids if m not in known]))
+    if set_history_id:
+        cache.set_state('history_id', history_id)
+
+def sync_mailbox(service, cache, count=10):
+    """Bring the local mail cache up to date.
+
+    With a stored historyId only the changes since then are fetched through
+    users.history.list; otherwise (or when the inbox has fewer than `count`
+    cached messages) the newest inbox messages are listed and the missing
+    ones fetched.
+    """
+    with cache.lock:
+        history_id = cache.get_state('history_id')
+        if history_id:
+            try:
+                _apply_history(service, cache, history_id)
+            except HttpError as error:
+                if getattr(error.resp, 'status', None) != 404:
+                    raise
+                # The historyId is too old for Gmail to replay; start over
+                cache.clear()
+                history_id = None
+        if not history_id or cache.count_label('INBOX') < count:
+            _backfill_inbox(service, cache, count, set_history_id=not history_id)
+
+def get_cached_emails(service, count=10, offline_error=None):
+    """Get the last (count) inbox emails from the local cache after an incremental sync.
+    Without a service (offline_error says why) the cache is served as it is."""
+    try:
+        cache = get_mail_cache()
+        if service is not None:
+            sync_mailbox(service, cache, count)
+        records = cache.recent('INBOX', count)
+    except HttpError as error:
+        return describe_fetch_error(error)
+    except sqlite3.Error:
+        if service is None:
+            return offline_error
+        # The cache is unusable; fall back to reading straight from Gmail
+        return get_emails(service, count)
+    except Exception as e:
+        return f"Failed to get emails: {str(e)}"
+
+    if not records:
+        return offline_error if service is None else "No emails found."
+    if service is None:
+        return (f"Gmail is unavailable ({offline_error}); showing cached emails.\n"
+                + format_email_list([record_to_email(record) for record in records]))
+    return format_email_list([record_to_email(record) for record in records])
+
+def search_emails(service, query, limit=5, offline_error=None):
+    """Search cached emails with the full-text index and return ranked hits with snippets.
+    Syncs first when a Gmail service is available; if that fails, or there is no
+    service (offline_error says why), the cache is searched as it is and the
+    result says it may be stale."""
+    stale_reason = offline_error if service is None else None
+    try:
+        cache = get_mail_cache()
+        if service is not None:
+            try:
+                sync_mailbox(service, cache)
+            except (HttpError, OSError, TransportError) as e:
+                stale_reason = f"Could not sync with Gmail: {e}"
+        records = cache.search(query, limit)
+    except Exception as e:
+        return f"Failed to search emails: {str(e)}"
+
+    note = f"{stale_reason}; cached emails may be out of date.\n" if stale_reason else ""
+    if not records:
+        return f"{note}No cached emails match '{query}'."
+    return f"{note}Search results for '{query}':\n" + format_email_list([record_to_email(record) for record in records])
+
 def format_email_data(message, truncate=True):
     """Format email data for display.
 
@@ -154,8 +497,11 @@ def format_email_data(message, truncate=True):
     sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
     date = next((h['value'] for h in headers if h['name'] == 'Date'), 'Unknown Date')
 
-    # Extract body text
-    body = extract_body(payload)
+    # Extract body text; metadata-format messages only carry Gmail's snippet
+    if 'parts' in payload or payload.get('body', {}).get('data'):
+        body = extract_body(payload)
+    else:
+        body = html.unescape(message.get('snippet', '')) or "[No body content]"
     if truncate and len(body) > 200:
         body = body[:200] + '...'
 
@@ -238,10 +584,27 @@ def format_single_email(email):
     result.append("Body:\n" + body_text)
     return "\n".join(result)
 
-def get_email_by_id(service, email_id):
-    """Retrieve a specific email by its Gmail message ID and return full content."""
+def get_email_by_id(service, email_id, offline_error=None):
+    """Retrieve a specific email by its Gmail message ID and return full content.
+    Served from the mail cache when the full message is already stored there;
+    without a service (offline_error says why) only the cache is used."""
+    try:
+        cache = get_mail_cache()
+        record = cache.get(email_id)
+    except sqlite3.Error:
+        cache, record = None, None
+    if record is not None and record.get('body') is not None:
+        return format_single_email(record_to_email(record, truncate=False))
+    if service is None:
+        return offline_error
+
     try:
         msg = service.users().messages().get(userId='me', id=email_id, format='full').execute()
+        if cache is not None:
+            try:
+                cache.store_message(message_to_record(msg))
+            except sqlite3.Error:
+                pass
         email = format_email_data(msg, truncate=False)
         return format_single_email(email)
     except HttpError as error:
@@ -257,9 +620,9 @@ def execute(args):
     
     action = args.get("action", "").lower()
     
-    # Authenticate Gmail
+    # Authenticate Gmail (reads can still run offline against the cache)
     service, error = authenticate_gmail()
-    if error:
+    if error and action not in CACHE_ACTIONS:
         return error
     
     if action == "send":
@@ -275,30 +638,32 @@ def execute(args):
         return send_message(service, message)
     
     elif action == "send_with_attachment":
-        # Send email with attachment
+        # Send email with one or more attachments
         to = args.get("to")
         subject = args.get("subject", "")
         body = args.get("body", "")
-        attachment_path = args.get("attachment_path")
+        attachment_paths = list(args.get("attachment_paths") or [])
+        if args.get("attachment_path"):
+            attachment_paths.insert(0, args.get("attachment_path"))
         
         if not to:
             return "No recipient email address provided."
         
-        if not attachment_path:
+        if not attachment_paths:
             return "No attachment path provided."
         
-        if not os.path.exists(attachment_path):
-            return f"Attachment file not found: {attachment_path}"
+        for attachment_path in attachment_paths:
+            if not os.path.exists(attachment_path):
+                return f"Attachment file not found: {attachment_path}"
         
-        message = create_message(to, subject, body, attachment_path)
-        return send_message(service, message)
+        return send_message_with_attachments(service, to, subject, body, attachment_paths)
     
     elif action in ("get_by_id", "get_id"):
         # Get specific email by ID
         email_id = args.get("id") or args.get("email_id")
         if not email_id:
             return "No email id provided."
-        return get_email_by_id(service, email_id)
+        return get_email_by_id(service, email_id, error)
     elif action == "get":
         # Get emails
         count = args.get("count", 10)  # Default to 10 emails
@@ -310,7 +675,18 @@ def execute(args):
                 count = 10
         except (ValueError, TypeError):
             count = 10
-        return get_emails(service, count)
+        return get_cached_emails(service, count, error)
+    
+    elif action == "search":
+        # Search the local mail cache
+        query = args.get("query", "")
+        if not query.strip():
+            return "No search query provided."
+        try:
+            limit = int(args.get("count", 5))
+        except (ValueError, TypeError):
+            limit = 5
+        return search_emails(service, query, max(limit, 1), error)
     
     else:
-        return f"Unknown Gmail action: {action}. Available actions: send, send_with_attachment, get, get_by_id"
+        return f"Unknown Gmail action: {action}. Available actions: send, send_with_attachment, get, get_by_id, search"
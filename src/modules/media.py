@@ -7,6 +7,9 @@
 import os
 from utils.windows_media import get_volume, set_volume, mute_volume, unmute_volume
 
+# Playback and volume changes must apply in order
+SEQUENTIAL_ACTIONS = True
+
 def execute(args):
     if args is None or len(args) == 0:
         return("No command provided.")
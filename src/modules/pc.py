@@ -12,6 +12,9 @@ import webbrowser
 import shutil
 from pathlib import Path
 
+# Power and screen actions must run in the order the model requested them
+SEQUENTIAL_ACTIONS = {"sleep", "restart", "shutdown", "lock", "screenshot"}
+
 
 def find_application(app_name):
     """Find application executable by name or path."""
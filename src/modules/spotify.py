@@ -13,6 +13,9 @@ from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
 import webbrowser
 
+# Playback commands must apply in order
+SEQUENTIAL_ACTIONS = True
+
 # --- Environment Setup ---
 load_dotenv()
 client_id = os.getenv('SPOTIFY_CLIENT_ID')
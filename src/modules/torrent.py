@@ -5,12 +5,26 @@
 
 import qbittorrentapi
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import urllib.parse
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from fake_useragent import UserAgent
 import re
 import time
 import os
+import json
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.mirror_health import get_mirror_health
+from utils.sqlite_store import connect_sqlite
+
+# Adding torrents changes qBittorrent state; search/list may run concurrently
+SEQUENTIAL_ACTIONS = {"add"}
 
 # Configuration - create torrent_config.py to override these settings
 try:
@@ -24,10 +38,65 @@ except ImportError:
         QBITTORRENT_PASSWORD = 'adminpass'  # CHANGE THIS!
         MAX_SEARCH_RESULTS = 5
         REQUEST_TIMEOUT = 10
+        SEARCH_DEADLINE = 10  # Seconds a whole search may take across all mirrors
+        SEARCH_MERGE_PAGES = 1  # Result pages merged before answering (first valid page wins)
+        SEARCH_RACE_WIDTH = 3  # Mirror endpoints fetched at once, best first
+        SEARCH_HEDGE_DELAY = 1.5  # Seconds without an answer before the next endpoints are started too
+        SEARCH_CACHE_TTL = 600  # Seconds cached search results are served as fresh
+        SEARCH_CACHE_STALE = 3600  # Until this age, cached results are served while refreshing in the background
+        SEARCH_CACHE_SIZE = 200  # Queries kept in the search cache (least recently used are dropped)
         ENABLE_SEARCH = False  # Disabled by default for safety
     
     config = Config()
 
+# The Pirate Bay mirrors and search URL formats (TPB now requires JavaScript for search results)
+TPB_MIRRORS = [
+    'https://thepiratebay.org',
+    'https://tpb.party',
+    'https://piratebay.live',
+    'https://thehiddenbay.com',
+    'https://piratebay.ink'
+]
+TPB_URL_FORMATS = [
+    "{mirror}/search/{query}/1/99/0",  # New format
+    "{mirror}/search.php?q={query}&all=on&search=Pirate+Search&page=0&orderby=",  # Old format
+    "{mirror}/s/?q={query}",  # Alternative format
+]
+
+# Result pages only need their results table parsed (or their links, for pages without one)
+TABLE_STRAINER = SoupStrainer('table')
+LINK_STRAINER = SoupStrainer('a')
+MAGNET_HREF = re.compile(r'^magnet:')
+JS_WALL_MARKERS = (b'enable js', b'enable javascript', b'javascript is required', b'requires javascript')
+NO_HITS_MARKERS = (b'no hits', b'no results', b'nothing found', b'0 results')
+try:
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# On-disk cache of search results, keyed by normalized query; kept in the utils
+# directory with the other caches
+SEARCH_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'utils', 'torrent_search_cache.db')
+SEARCH_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    query TEXT PRIMARY KEY,
+    results TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    used_at REAL NOT NULL
+)
+"""
+
+USER_AGENT_POOL_SIZE = 10
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) Gecko/20100101 Firefox/128.0'
+
+_search_executor = None
+_http_session = None
+_user_agents = None
+_refreshing = set()  # Normalized queries being refreshed in the background
+_refresh_lock = threading.Lock()
+
 
 def execute(args):
     """
@@ -83,7 +152,7 @@ def search_torrents(query):
         
         # Search The Pirate Bay
         try:
-            tpb_results = search_tpb(query)
+            tpb_results = cached_search_tpb(query)
             results.extend(tpb_results)
         except Exception as e:
             pass
@@ -111,192 +180,379 @@ def search_torrents(query):
         return f"Error searching for torrents: {str(e)}"
 
 
+def normalize_query(query):
+    """Cache key for a query: case, surrounding and repeated whitespace don't matter."""
+    return " ".join(query.lower().split())
+
+
+@contextmanager
+def connect_search_cache():
+    """Connection to the search cache, creating its table on first use."""
+    with connect_sqlite(SEARCH_CACHE_FILE) as conn:
+        conn.execute(SEARCH_CACHE_SCHEMA)
+        yield conn
+
+
+def store_search_results(key, results):
+    """Save results for a query and evict the least recently used queries beyond SEARCH_CACHE_SIZE."""
+    now = time.time()
+    with connect_search_cache() as conn:
+        conn.execute("INSERT OR REPLACE INTO searches (query, results, fetched_at, used_at) VALUES (?, ?, ?, ?)",
+                     (key, json.dumps(results), now, now))
+        conn.execute("DELETE FROM searches WHERE query NOT IN "
+                     "(SELECT query FROM searches ORDER BY used_at DESC LIMIT ?)",
+                     (getattr(config, 'SEARCH_CACHE_SIZE', 200),))
+
+
+def refresh_search(query, key):
+    """Search again and update the cache (run in the background for stale entries)."""
+    try:
+        results = search_tpb(query)
+        if results:
+            store_search_results(key, results)
+    except Exception as e:
+        print(f"Warning: Could not refresh torrent search for '{query}': {e}")
+    finally:
+        with _refresh_lock:
+            _refreshing.discard(key)
+
+
+def cached_search_tpb(query):
+    """
+    Search The Pirate Bay through the on-disk search cache.
+    
+    Results younger than SEARCH_CACHE_TTL are returned as they are. Older
+    results, up to SEARCH_CACHE_STALE, are returned right away too while a
+    background search refreshes them. Anything older is searched again
+    before answering. Searches without results are not cached.
+    
+    Args:
+        query (str): Search query
+    
+    Returns:
+        list: List of torrent dictionaries
+    """
+    key = normalize_query(query)
+    ttl = getattr(config, 'SEARCH_CACHE_TTL', 600)
+    stale_limit = getattr(config, 'SEARCH_CACHE_STALE', 3600)
+    
+    row = None
+    try:
+        with connect_search_cache() as conn:
+            row = conn.execute("SELECT results, fetched_at FROM searches WHERE query = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE searches SET used_at = ? WHERE query = ?", (time.time(), key))
+    except sqlite3.Error as e:
+        print(f"Warning: Torrent search cache unavailable: {e}")
+    
+    if row is not None:
+        age = time.time() - row[1]
+        if age < ttl:
+            return json.loads(row[0])
+        if age < stale_limit:
+            with _refresh_lock:
+                start_refresh = key not in _refreshing
+                _refreshing.add(key)
+            if start_refresh:
+                threading.Thread(target=refresh_search, args=(query, key),
+                                 name="torrent-search-refresh", daemon=True).start()
+            return json.loads(row[0])
+    
+    results = search_tpb(query)
+    if results:
+        try:
+            store_search_results(key, results)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not cache torrent search for '{query}': {e}")
+    return results
+
+
+def build_tpb_candidates(query):
+    """
+    Build every mirror/URL-format combination to try for a query.
+    
+    Args:
+        query (str): Search query
+    
+    Returns:
+        list: (mirror, url_format_index, url) tuples
+    """
+    encoded_query = urllib.parse.quote(query)
+    return [
+        (mirror, index, url_format.format(mirror=mirror, query=encoded_query))
+        for mirror in TPB_MIRRORS
+        for index, url_format in enumerate(TPB_URL_FORMATS)
+    ]
+
+
+def parse_tpb_page(content):
+    """
+    Parse a TPB result page.
+    
+    Pages without a magnet link are never handed to the HTML parser; the
+    JavaScript-wall check on them is a byte search. Otherwise parsing (with
+    lxml) starts at the table holding the first magnet link and keeps only
+    tables, and each result row is read in one pass.
+    
+    Args:
+        content (bytes): Page HTML
+    
+    Returns:
+        list: Torrent dictionaries (empty if the page has no results),
+              or None if the page is a JavaScript wall
+    """
+    lowered = content.lower()
+    first_magnet = lowered.find(b'magnet:')
+    if first_magnet == -1:
+        if any(marker in lowered for marker in JS_WALL_MARKERS):
+            return None
+        return []
+    
+    # Skip everything before the table holding the first result
+    table_start = lowered.rfind(b'<table', 0, first_magnet)
+    if table_start != -1:
+        soup = BeautifulSoup(content[table_start:], HTML_PARSER, parse_only=TABLE_STRAINER)
+    else:
+        soup = BeautifulSoup(content, HTML_PARSER, parse_only=LINK_STRAINER)
+    results = []
+    seen_rows = set()
+    
+    for i, link in enumerate(soup.find_all('a', href=MAGNET_HREF)):
+        if len(results) >= 5:
+            break
+        try:
+            magnet = link['href']
+            row = link.find_parent('tr')
+            cells = row.find_all('td') if row is not None else []
+            
+            if len(cells) >= 4:
+                if id(row) in seen_rows:
+                    continue  # Second magnet link of a row already read
+                seen_rows.add(id(row))
+                
+                # Get name from the second cell (the first holds the category)
+                name_cell = cells[1]
+                name_links = name_cell.find_all('a')
+                name = name_links[0].get_text(strip=True) if name_links else f"Torrent {i+1}"
+                
+                # Size: "Size ..." in the description of the classic layout, otherwise cell 4
+                size = "Unknown"
+                size_font = name_cell.find('font', class_='detDesc')
+                if size_font:
+                    size_match = re.search(r'Size ([^,]+)', size_font.get_text())
+                    if size_match:
+                        size = size_match.group(1)
+                elif len(cells) > 4:
+                    size = cells[4].get_text(strip=True)
+                
+                # Seeders: cell 5 in the newer layout, cell 2 in the classic one
+                seeders = "Unknown"
+                for index in (5, 2):
+                    if len(cells) > index:
+                        seeders_text = cells[index].get_text(strip=True)
+                        if seeders_text.replace(',', '').isdigit():
+                            seeders = seeders_text
+                            break
+            else:
+                # Not in a usable table row, try to find the name nearby
+                name_elem = link.find_previous('a') or link.find_next('a') or link
+                name = name_elem.get_text(strip=True) if name_elem else f"Torrent {i+1}"
+                seeders = "Unknown"
+                size = "Unknown"
+            
+            results.append({
+                'name': name[:100],  # Limit name length
+                'size': size,
+                'seeders': seeders,
+                'magnet': magnet,
+                'source': 'TPB'
+            })
+        except Exception as e:
+            continue
+    
+    return results
+
+
+def is_no_hits_page(content):
+    """Whether a page without results is a real TPB answer saying nothing matched."""
+    lowered = content.lower()
+    return any(marker in lowered for marker in NO_HITS_MARKERS)
+
+
+def fetch_tpb_candidate(mirror, url_format, url, headers, timeout, cancelled):
+    """
+    Download and parse one candidate URL, recording the outcome in the mirror health table.
+    
+    Args:
+        mirror (str): Mirror base URL
+        url_format (int): Index of the URL format in TPB_URL_FORMATS
+        url (str): Search URL
+        headers (dict): Request headers
+        timeout (float): Seconds allowed for connecting and for each read
+        cancelled (threading.Event): Set once the search no longer needs this page
+    
+    Returns:
+        list: Torrent dictionaries, empty on failure, or None for a JavaScript wall
+    """
+    health = get_mirror_health()
+    started = time.monotonic()
+    try:
+        with get_http_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code != 200:
+                health.record(mirror, url_format, "error")
+                return []
+            chunks = []
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if cancelled.is_set():
+                    return []  # Another candidate already answered; drop the connection
+                chunks.append(chunk)
+    except Exception:
+        if not cancelled.is_set():
+            health.record(mirror, url_format, "error")
+        raise
+    latency = time.monotonic() - started
+    
+    content = b"".join(chunks)
+    page_results = parse_tpb_page(content)
+    if page_results is None:
+        health.record(mirror, url_format, "js_wall")
+    elif page_results:
+        health.record(mirror, url_format, "ok", latency)
+    elif is_no_hits_page(content):
+        health.record(mirror, url_format, "empty", latency)
+    else:
+        # Neither results nor a "no hits" message: a parked domain or challenge page
+        health.record(mirror, url_format, "unrecognized")
+    return page_results
+
+
+def get_http_session():
+    """
+    Returns the shared keep-alive session used for searches.
+    
+    Connections (and their DNS lookups and TLS handshakes) are reused across
+    searches. Connection failures and gateway errors are retried once.
+    """
+    global _http_session
+    if _http_session is None:
+        retry = Retry(total=1, connect=1, read=0, status=1, backoff_factor=0.2,
+                      status_forcelist=(500, 502, 503, 504), allowed_methods=frozenset({'GET'}),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=len(TPB_MIRRORS), pool_maxsize=len(TPB_URL_FORMATS) * 2,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+        _http_session = session
+    return _http_session
+
+
+def get_user_agents():
+    """Returns a pool of browser user agents, loaded once (loading the UA dataset is slow)."""
+    global _user_agents
+    if _user_agents is None:
+        try:
+            ua = UserAgent()
+            _user_agents = list({ua.random for _ in range(USER_AGENT_POOL_SIZE)})
+        except Exception as e:
+            print(f"Warning: Could not load user agents, using a default one: {e}")
+            _user_agents = [DEFAULT_USER_AGENT]
+    return _user_agents
+
+
+def get_search_executor():
+    """Returns the shared thread pool that fetches search candidates."""
+    global _search_executor
+    if _search_executor is None:
+        _search_executor = ThreadPoolExecutor(max_workers=len(TPB_MIRRORS) * len(TPB_URL_FORMATS),
+                                              thread_name_prefix="torrent-search")
+    return _search_executor
+
+
 def search_tpb(query):
     """
     Search The Pirate Bay for torrents.
     
+    Candidates are ranked by the mirror health table, so the historically
+    fastest working endpoints go first and endpoints on cool-down are skipped.
+    They are launched SEARCH_RACE_WIDTH at a time: the next batch starts when
+    the running ones have all failed or SEARCH_HEDGE_DELAY passes without an
+    answer. Endpoints that have never been tried start in the first batch.
+    The first pages that parse with results win (SEARCH_MERGE_PAGES of
+    them are merged) and the rest are cancelled, so a search takes at most one
+    SEARCH_DEADLINE.
+    
     Args:
         query (str): Search query
     
     Returns:
         list: List of torrent dictionaries
     """
-    results = []
-    ua = UserAgent()
-    headers = {
-        'User-Agent': ua.random,
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive'
-    }
+    headers = {'User-Agent': random.choice(get_user_agents())}
+    deadline = getattr(config, 'SEARCH_DEADLINE', config.REQUEST_TIMEOUT)
+    merge_pages = getattr(config, 'SEARCH_MERGE_PAGES', 1)
+    race_width = getattr(config, 'SEARCH_RACE_WIDTH', 3)
+    hedge_delay = getattr(config, 'SEARCH_HEDGE_DELAY', 1.5)
+    request_timeout = min(config.REQUEST_TIMEOUT, deadline)
+    
+    health = get_mirror_health()
+    queue = health.rank(build_tpb_candidates(query))
+    cancelled = threading.Event()
+    executor = get_search_executor()
+    pending = set()
     
+    def launch(candidates):
+        for candidate in candidates:
+            queue.remove(candidate)
+            mirror, url_format, url = candidate
+            pending.add(executor.submit(fetch_tpb_candidate, mirror, url_format, url,
+                                        headers, request_timeout, cancelled))
+    
+    results = []
+    seen_magnets = set()
+    pages = 0
+    give_up_at = time.monotonic() + deadline
     try:
-        # The Pirate Bay search URLs (TPB now requires JavaScript for search results)
-        tpb_mirrors = [
-            'https://thepiratebay.org',
-            'https://tpb.party',
-            'https://piratebay.live',
-            'https://thehiddenbay.com',
-            'https://piratebay.ink'
-        ]
-        
-        encoded_query = urllib.parse.quote(query)
-        
-        for mirror in tpb_mirrors:
-            try:
-                # Try both old and new URL formats
-                search_urls = [
-                    f"{mirror}/search/{encoded_query}/1/99/0",  # New format
-                    f"{mirror}/search.php?q={encoded_query}&all=on&search=Pirate+Search&page=0&orderby=",  # Old format
-                    f"{mirror}/s/?q={encoded_query}",  # Alternative format
-                ]
-                
-                for search_url in search_urls:
-                    response = requests.get(search_url, headers=headers, timeout=config.REQUEST_TIMEOUT)
-                    
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'html.parser')
-                        
-                        # Check for JavaScript requirement
-                        page_text = soup.get_text().lower()
-                        if 'enable js' in page_text or 'javascript' in page_text:
-                            continue  # Try next URL/mirror
-                            
-                        # Try different parsing methods
-                        result_count = 0
-                        
-                        # Method 1: Look for traditional table structure
-                        for i, row in enumerate(soup.find_all('tr')[1:6]):
-                            try:
-                                cells = row.find_all('td')
-                                if len(cells) >= 4:
-                                    # Get torrent name
-                                    name_cell = cells[1]
-                                    name_links = name_cell.find_all('a')
-                                    
-                                    if len(name_links) >= 1:
-                                        name = name_links[0].get_text(strip=True)
-                                        
-                                        # Get magnet link
-                                        magnet_links = name_cell.find_all('a', href=lambda x: x and x.startswith('magnet:'))
-                                        if not magnet_links:
-                                            # Check other cells for magnet link
-                                            for cell in cells:
-                                                magnet_links = cell.find_all('a', href=lambda x: x and x.startswith('magnet:'))
-                                                if magnet_links:
-                                                    break
-                                        
-                                        if magnet_links:
-                                            magnet = magnet_links[0]['href']
-                                            
-                                            # Get size from cell 4 (based on debug output)
-                                            size = "Unknown"
-                                            if len(cells) > 4:
-                                                size = cells[4].get_text(strip=True)
-                                            
-                                            # Get seeders from cell 5 (based on debug output)
-                                            seeders = "Unknown"
-                                            if len(cells) > 5:
-                                                seeders_text = cells[5].get_text(strip=True)
-                                                if seeders_text.replace(',', '').isdigit():
-                                                    seeders = seeders_text
-                                            
-                                            results.append({
-                                                'name': name,
-                                                'size': size,
-                                                'seeders': seeders,
-                                                'magnet': magnet,
-                                                'source': 'TPB'
-                                            })
-                                            result_count += 1
-                            except Exception as e:
-                                continue
-                        
-                        # Method 2: Look for div-based structure
-                        if result_count == 0:
-                            divs = soup.find_all('div', class_=['list-item', 'torrent-item', 'result'])
-                            
-                        # Method 3: Look for any links that contain magnet
-                        if result_count == 0:
-                            magnet_links = soup.find_all('a', href=lambda x: x and 'magnet:' in x)
-                            
-                            # Debug: let's see the page structure
-                            if magnet_links:
-                                first_link = magnet_links[0]
-                                row = first_link.find_parent('tr')
-                                if row:
-                                    cells = row.find_all('td')
-                                    for idx, cell in enumerate(cells):
-                                        pass
-                                else:
-                                    pass
-                            
-                            for i, link in enumerate(magnet_links[:5]):
-                                try:
-                                    magnet = link['href']
-                                    
-                                    # Try to find the torrent info in the row structure
-                                    row = link.find_parent('tr')
-                                    if row:
-                                        cells = row.find_all('td')
-                                        if len(cells) >= 4:
-                                            # Get name from first cell or link
-                                            name_cell = cells[1] if len(cells) > 1 else cells[0]
-                                            name_links = name_cell.find_all('a')
-                                            name = name_links[0].get_text(strip=True) if name_links else f"Torrent {i+1}"
-                                            
-                                            # Get seeders (usually in column 2 or 3)
-                                            seeders = "Unknown"
-                                            if len(cells) >= 3:
-                                                seeders_text = cells[2].get_text(strip=True)
-                                                if seeders_text.isdigit():
-                                                    seeders = seeders_text
-                                            
-                                            # Get size from description in name cell
-                                            size = "Unknown"
-                                            size_font = name_cell.find('font', class_='detDesc')
-                                            if size_font:
-                                                size_text = size_font.get_text()
-                                                size_match = re.search(r'Size ([^,]+)', size_text)
-                                                if size_match:
-                                                    size = size_match.group(1)
-                                        else:
-                                            # Fallback: try to find name nearby
-                                            parent = link.parent
-                                            name_elem = parent.find_previous('a') or parent.find_next('a') or parent
-                                            name = name_elem.get_text(strip=True) if name_elem else f"Torrent {i+1}"
-                                            seeders = "Unknown"
-                                            size = "Unknown"
-                                    else:
-                                        # Not in a table row, try other methods
-                                        parent = link.parent
-                                        name_elem = parent.find_previous('a') or parent.find_next('a') or parent
-                                        name = name_elem.get_text(strip=True) if name_elem else f"Torrent {i+1}"
-                                        seeders = "Unknown"
-                                        size = "Unknown"
-                                    
-                                    results.append({
-                                        'name': name[:100],  # Limit name length
-                                        'size': size,
-                                        'seeders': seeders,
-                                        'magnet': magnet,
-                                        'source': 'TPB'
-                                    })
-                                    result_count += 1
-                                except Exception as e:
-                                    continue
-                        
-                        if result_count > 0:
-                            return results  # Success, return immediately
-                    
-            except Exception as e:
-                continue  # Try next mirror
-        
-        return results
-        
-    except Exception as e:
-        return []
+        # Endpoints without history start right away, so new mirrors get measured
+        launch(queue[:race_width] + [candidate for candidate in queue[race_width:]
+                                     if not health.is_known(candidate[0], candidate[1])])
+        while pending and pages < merge_pages:
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                break  # Deadline reached: answer with whatever arrived in time
+            done, pending = wait(pending, timeout=min(remaining, hedge_delay) if queue else remaining,
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                launch(queue[:race_width])  # The running candidates are slow: start the next ones alongside
+                continue
+            for future in done:
+                try:
+                    page_results = future.result()
+                except Exception as e:
+                    continue  # This candidate failed; others are still running
+                if not page_results:
+                    continue  # JavaScript wall or no results
+                for torrent in page_results:
+                    if torrent['magnet'] not in seen_magnets:
+                        seen_magnets.add(torrent['magnet'])
+                        results.append(torrent)
+                pages += 1
+            if not pending:
+                launch(queue[:race_width])  # Everything running has failed: try the next ones
+    finally:
+        # Stop the candidates that are still queued or downloading
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+        health.save()
+    
+    return results
 
 
 
@@ -95,6 +95,7 @@ class BubbleManager:
         self.bubbles_file = bubbles_file
         self.bubbles: Dict[str, Bubble] = {}
         self.message_count = 0
+        self.version = 0  # Bumped on every save so callers can cache derived context
         self.load_bubbles()
         self.cleanup_expired_bubbles()
     
@@ -114,6 +115,7 @@ class BubbleManager:
     
     def save_bubbles(self):
         """Save bubbles to the JSON file."""
+        self.version += 1
         try:
             os.makedirs(os.path.dirname(self.bubbles_file), exist_ok=True)
             data = {
@@ -308,3 +310,7 @@ def get_bubble_context() -> str:
 def increment_message_count():
     """Increment the global message count."""
     get_bubble_manager().increment_message_count()
+
+def get_bubble_version() -> int:
+    """Get a counter that changes whenever the bubble store changes."""
+    return get_bubble_manager().version
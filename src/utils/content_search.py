@@ -0,0 +1,217 @@
+"""
+Content search (grep) for the files module.
+
+Each file is memory-mapped and searched with a bytes regex, so it is never
+read into a Python string. Only the matching lines are decoded. A file whose
+first block contains a NUL byte is treated as binary and skipped. Large
+searches are spread across a process pool, since regex matching is CPU bound
+and holds the GIL. Small ones run in-process to avoid the pool's startup
+cost.
+"""
+
+import mmap
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.crawler import is_directory, walk_entries
+
+
+BINARY_SNIFF_SIZE = 8192  # Bytes checked for NUL to detect binary files
+MAX_LINE_LENGTH = 200  # Matching lines are cut to this many characters
+POOL_MIN_BYTES = 8 * 1024 * 1024  # Below this much data, searching in-process is faster than the pool
+NEWLINE_WINDOW = 64 * 1024  # Bytes copied at a time when counting lines before a match
+POOL_BATCH_BYTES = 4 * 1024 * 1024  # Data per task sent to the pool (at least one file)
+POOL_PENDING = 2  # Tasks queued per worker; more are only submitted as results come back
+GREP_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+_process_pool = None
+
+
+@lru_cache(maxsize=32)
+def compile_pattern(pattern: str, is_regex: bool, case_sensitive: bool):
+    """Compile a search pattern to a bytes regex (case folding is ASCII-only for bytes).
+
+    Whole files are searched at once, so ^ and $ match at every line (MULTILINE).
+    """
+    source = pattern.encode("utf-8")
+    if not is_regex:
+        source = re.escape(source)
+    return re.compile(source, re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE)
+
+
+def count_newlines(data, start: int, end: int) -> int:
+    """Newlines in data[start:end], copying at most NEWLINE_WINDOW bytes at a time."""
+    count = 0
+    for window in range(start, end, NEWLINE_WINDOW):
+        count += data[window:min(window + NEWLINE_WINDOW, end)].count(b"\n")
+    return count
+
+
+def grep_file(path: str, pattern: str, is_regex: bool, case_sensitive: bool,
+              max_matches: int) -> Optional[Tuple[str, List[Tuple[int, str]], bool]]:
+    """Search one file. Runs in pool workers, so it only takes picklable arguments.
+
+    Returns:
+        (path, [(line_number, line)], truncated), or None for binary,
+        unreadable or non-matching files.
+    """
+    regex = compile_pattern(pattern, is_regex, case_sensitive)
+    try:
+        with open(path, "rb") as f:
+            if b"\0" in f.read(BINARY_SNIFF_SIZE):
+                return None
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                matches = []
+                line_number = 1
+                counted_to = 0
+                position = 0
+                while True:
+                    found = regex.search(data, position)
+                    if found is None:
+                        return (path, matches, False) if matches else None
+                    if len(matches) >= max_matches:
+                        return path, matches, True
+                    line_start = data.rfind(b"\n", 0, found.start()) + 1
+                    line_end = data.find(b"\n", found.end())
+                    if line_end == -1:
+                        line_end = len(data)
+                    line_number += count_newlines(data, counted_to, line_start)
+                    counted_to = line_start
+                    line = data[line_start:line_end].decode("utf-8", errors="replace").strip()
+                    if len(line) > MAX_LINE_LENGTH:
+                        line = line[:MAX_LINE_LENGTH] + "..."
+                    matches.append((line_number, line))
+                    # One result per line: continue after the end of this line
+                    position = line_end + 1
+    except (OSError, ValueError):
+        return None
+
+
+def grep_batch(paths: List[str], pattern: str, is_regex: bool, case_sensitive: bool,
+               max_matches: int) -> List[Optional[Tuple[str, List[Tuple[int, str]], bool]]]:
+    """Search several files in one pool task; returns grep_file's result for each."""
+    return [grep_file(path, pattern, is_regex, case_sensitive, max_matches) for path in paths]
+
+
+def batch_candidates(candidates: List[Tuple[str, int]]) -> Iterable[List[str]]:
+    """Group (path, size) candidates into lists of paths holding about POOL_BATCH_BYTES each."""
+    batch, batch_bytes = [], 0
+    for file_path, size in candidates:
+        batch.append(file_path)
+        batch_bytes += size
+        if batch_bytes >= POOL_BATCH_BYTES:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+
+def pool_outcomes(candidates: List[Tuple[str, int]], arguments: Tuple) -> Iterable:
+    """Yield grep_file results from the process pool as batches finish.
+
+    Only POOL_PENDING tasks per worker are queued at a time, so when the
+    caller stops early, the remaining files are never searched.
+    """
+    pool = get_process_pool()
+    batches = batch_candidates(candidates)
+    pending = set()
+    try:
+        while True:
+            for batch in batches:
+                pending.add(pool.submit(grep_batch, batch, *arguments))
+                if len(pending) >= GREP_WORKERS * POOL_PENDING:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Returns the shared process pool used for large content searches."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=GREP_WORKERS)
+    return _process_pool
+
+
+def candidate_files(path: str, extensions: Optional[Iterable[str]] = None, max_size: Optional[int] = None,
+                    recursive: bool = True) -> Iterable[Tuple[str, int]]:
+    """Yield (path, size) of regular files under path that pass the type and size filters."""
+    if os.path.isfile(path):
+        yield path, os.path.getsize(path)
+        return
+    if extensions:
+        extensions = tuple(ext.lower() if ext.startswith(".") else "." + ext.lower() for ext in extensions)
+    for entry in walk_entries(path, recursive=recursive, prefetch_stat=True):
+        if is_directory(entry):
+            continue
+        if extensions and not entry.name.lower().endswith(extensions):
+            continue
+        try:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            size = entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+        if size == 0 or (max_size is not None and size > max_size):
+            continue
+        yield entry.path, size
+
+
+def search_contents(path: str, pattern: str, is_regex: bool = False, case_sensitive: bool = False,
+                    extensions: Optional[Iterable[str]] = None, max_size: Optional[int] = None,
+                    recursive: bool = True, max_matches: int = 5, max_files: int = 50) -> Dict:
+    """Find lines matching a pattern in the files under path.
+
+    Args:
+        path: A directory to search, or a single file.
+        pattern: Literal text, or a regular expression when is_regex is True.
+        case_sensitive: Match case exactly (case-insensitive matching is ASCII-only).
+        extensions: Only search files with these extensions (e.g. ['.py', 'txt']).
+        max_size: Skip files larger than this many bytes.
+        recursive: Include subdirectories.
+        max_matches: Matching lines reported per file.
+        max_files: Stop after this many files with matches.
+
+    Returns:
+        Dict with 'results' ([(path, [(line_number, line)], truncated)] sorted by path),
+        'files_searched' (files actually scanned) and 'stopped_early'.
+
+    Raises:
+        re.error: If the regular expression is invalid.
+    """
+    compile_pattern(pattern, is_regex, case_sensitive)  # Fail fast on a bad regex
+    candidates = list(candidate_files(path, extensions, max_size, recursive))
+    total_bytes = sum(size for _, size in candidates)
+    arguments = (pattern, is_regex, case_sensitive, max_matches)
+
+    if total_bytes < POOL_MIN_BYTES or len(candidates) < 2:
+        outcomes = (grep_file(file_path, *arguments) for file_path, _ in candidates)
+    else:
+        candidates.sort(key=lambda candidate: candidate[1], reverse=True)
+        outcomes = pool_outcomes(candidates, arguments)
+
+    results = []
+    stopped_early = False
+    files_searched = 0
+    for outcome in outcomes:
+        files_searched += 1
+        if outcome is None:
+            continue
+        results.append(outcome)
+        if len(results) >= max_files:
+            stopped_early = True
+            break
+    outcomes.close()  # Cancels the pool tasks not started yet
+    results.sort(key=lambda result: result[0])
+    return {"results": results, "files_searched": files_searched, "stopped_early": stopped_early}
@@ -0,0 +1,347 @@
+"""
+Copy engine for the files module's copy and move actions.
+
+Data moves with os.copy_file_range or os.sendfile where the platform has
+them, so it stays in the kernel, with a plain read/write loop as fallback.
+Copies run in CHUNK_SIZE steps so progress and throughput can be printed
+along the way. Directory trees are copied by a pool of worker threads.
+
+Files of at least RESUMABLE_SIZE are copied into '<destination>.partial'.
+Next to it, a manifest records the source (path, file ID, size and mtime)
+and a CRC32 checksum for every finished chunk. If the copy is interrupted,
+the next copy of the same, unchanged source checks the chunks already on
+disk against the manifest and continues after the last good one.
+"""
+
+import errno
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.crawler import is_directory, walk_entries
+
+
+CHUNK_SIZE = 16 * 1024 * 1024  # Bytes per copy step (and per checksum in resumable copies)
+BUFFER_SIZE = 1024 * 1024  # Read size of the fallback read/write loop
+RESUMABLE_SIZE = 64 * 1024 * 1024  # Files at least this large can resume after an interruption
+COPY_WORKERS = 4  # Files copied at once when copying a directory tree
+PROGRESS_INTERVAL = 0.5  # Seconds between progress lines
+
+# Kernel copy methods to try in order; one is dropped for good when the OS doesn't implement it
+_kernel_methods = [name for name in ("copy_file_range", "sendfile") if hasattr(os, name)]
+_UNSUPPORTED = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.ENOTSOCK, errno.EBADF,
+                getattr(errno, "EOPNOTSUPP", errno.EINVAL), getattr(errno, "ENOTSUP", errno.EINVAL)}
+
+
+def format_size(size: float) -> str:
+    """Human-readable byte count."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class CopyProgress:
+    """Thread-safe byte counter that prints progress and throughput while a copy runs."""
+
+    def __init__(self, total_bytes: int, label: str = "Copying"):
+        self.total_bytes = total_bytes
+        self.label = label
+        self.done_bytes = 0
+        self.started = time.monotonic()
+        self._last_print = self.started
+        self._printed = False
+        self._lock = threading.Lock()
+
+    def advance(self, count: int):
+        with self._lock:
+            self.done_bytes += count
+            now = time.monotonic()
+            if now - self._last_print < PROGRESS_INTERVAL:
+                return
+            self._last_print = now
+            percent = 100 * self.done_bytes / self.total_bytes if self.total_bytes else 100
+            rate = self.done_bytes / max(now - self.started, 1e-6)
+            print(f"\r{self.label}: {percent:.0f}% ({format_size(self.done_bytes)} / "
+                  f"{format_size(self.total_bytes)}) at {format_size(rate)}/s   ", end="", flush=True)
+            self._printed = True
+
+    def finish(self) -> float:
+        """End the progress line and return the elapsed seconds."""
+        if self._printed:
+            print()
+        return time.monotonic() - self.started
+
+
+def _copy_span(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """Copy count bytes at offset from src_fd to the same offset in dst_fd. Returns bytes copied."""
+    for method in list(_kernel_methods):
+        try:
+            if method == "copy_file_range":
+                copied = 0
+                while copied < count:
+                    step = os.copy_file_range(src_fd, dst_fd, count - copied,
+                                              offset + copied, offset + copied)
+                    if step == 0:
+                        break
+                    copied += step
+                return copied
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            copied = 0
+            while copied < count:
+                step = os.sendfile(dst_fd, src_fd, offset + copied, count - copied)
+                if step == 0:
+                    break
+                copied += step
+            return copied
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            # Not possible for these files (e.g. across filesystems): try the next method.
+            # Copies are offset based, so bytes already written are simply written again.
+            if e.errno == errno.ENOSYS and method in _kernel_methods:
+                _kernel_methods.remove(method)
+
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    copied = 0
+    while copied < count:
+        data = os.read(src_fd, min(BUFFER_SIZE, count - copied))
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        copied += len(data)
+    return copied
+
+
+def _chunk_checksum(fd: int, offset: int, length: int) -> int:
+    """CRC32 of a span of a file."""
+    crc = 0
+    os.lseek(fd, offset, os.SEEK_SET)
+    while length > 0:
+        data = os.read(fd, min(BUFFER_SIZE, length))
+        if not data:
+            break
+        crc = zlib.crc32(data, crc)
+        length -= len(data)
+    return crc
+
+
+def _source_identity(source: str, source_stat) -> Dict[str, Any]:
+    """Manifest fields that tie a partial copy to one source file."""
+    return {"source": os.path.normcase(os.path.abspath(source)), "device": source_stat.st_dev,
+            "inode": source_stat.st_ino, "size": source_stat.st_size, "mtime_ns": source_stat.st_mtime_ns}
+
+
+def _load_manifest(manifest_path: str, source: str, source_stat) -> Optional[Dict[str, Any]]:
+    """The manifest of an interrupted copy of this exact source, if any."""
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    identity = _source_identity(source, source_stat)
+    if any(manifest.get(key) != value for key, value in identity.items()) or manifest.get("chunk_size") != CHUNK_SIZE:
+        return None  # Another file, or the source changed since, so the partial copy is useless
+    return manifest
+
+
+def _save_manifest(manifest_path: str, manifest: Dict[str, Any]):
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+
+
+def copy_file(source: str, destination: str, progress: Optional[CopyProgress] = None) -> Dict[str, int]:
+    """Copy one file's data and metadata (like shutil.copy2).
+
+    Raises:
+        shutil.SameFileError: If destination is the source file.
+
+    Returns:
+        Dict with 'bytes' copied now and 'resumed' bytes kept from an interrupted copy.
+    """
+    _check_not_same_file(source, destination)
+    source_stat = os.stat(source)
+    size = source_stat.st_size
+    resumable = size >= RESUMABLE_SIZE
+    target = destination + ".partial" if resumable else destination
+    manifest_path = destination + ".partial.json"
+
+    checksums: List[int] = []
+    if resumable and os.path.exists(target):
+        manifest = _load_manifest(manifest_path, source, source_stat)
+        if manifest is not None:
+            checksums = manifest["checksums"]
+
+    resumed = 0
+    # Resumable copies read their chunks back for checksums and keep existing data
+    dst_flags = os.O_CREAT | getattr(os, "O_BINARY", 0) | (os.O_RDWR if resumable else os.O_WRONLY | os.O_TRUNC)
+    src_fd = os.open(source, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        dst_fd = os.open(target, dst_flags, 0o666)
+        try:
+            if checksums:
+                # Keep the chunks that still match their checksums
+                good = 0
+                for index, crc in enumerate(checksums):
+                    if _chunk_checksum(dst_fd, index * CHUNK_SIZE, CHUNK_SIZE) != crc:
+                        break
+                    good += 1
+                checksums = checksums[:good]
+                resumed = min(good * CHUNK_SIZE, size)
+                if progress is not None:
+                    progress.advance(resumed)
+            os.ftruncate(dst_fd, resumed)
+
+            manifest = {**_source_identity(source, source_stat), "chunk_size": CHUNK_SIZE, "checksums": checksums}
+            offset = resumed
+            while offset < size:
+                count = min(CHUNK_SIZE, size - offset)
+                copied = _copy_span(src_fd, dst_fd, offset, count)
+                if copied == 0:
+                    break  # The source shrank while copying
+                if resumable:
+                    # Just written, so this reads back from the page cache rather than the disk
+                    checksums.append(_chunk_checksum(dst_fd, offset, copied))
+                    _save_manifest(manifest_path, manifest)
+                offset += copied
+                if progress is not None:
+                    progress.advance(copied)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    if resumable:
+        os.replace(target, destination)
+        try:
+            os.remove(manifest_path)
+        except OSError:
+            pass
+    shutil.copystat(source, destination)
+    return {"bytes": offset - resumed, "resumed": resumed}
+
+
+def _resolve_destination(source: str, destination: str) -> str:
+    """Copying into an existing directory puts the source inside it (like cp and shutil.copy)."""
+    if os.path.isdir(destination):
+        return os.path.join(destination, os.path.basename(os.path.normpath(source)))
+    return destination
+
+
+def _check_not_same_file(source: str, destination: str):
+    """Raise shutil.SameFileError if destination is the source (or a hard link to it)."""
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        raise shutil.SameFileError(f"'{source}' and '{destination}' are the same file")
+
+
+def _tree_plan(source: str, destination: str) -> Tuple[List[str], List[Tuple[str, str, int]], List[Tuple[str, str]]]:
+    """Directories to create, files to copy (with sizes) and symlinks to recreate."""
+    directories = [destination]
+    files = []
+    links = []
+    for entry in walk_entries(source, prefetch_stat=True):
+        target = os.path.join(destination, os.path.relpath(entry.path, source))
+        if entry.is_symlink():
+            links.append((entry.path, target))
+        elif is_directory(entry):
+            directories.append(target)
+        else:
+            try:
+                files.append((entry.path, target, entry.stat(follow_symlinks=False).st_size))
+            except OSError:
+                files.append((entry.path, target, 0))
+    return directories, files, links
+
+
+def copy_path(source: str, destination: str, label: str = "Copying") -> Dict[str, Any]:
+    """Copy a file or a whole directory tree, printing progress.
+
+    Returns:
+        Dict with destination, files, bytes, resumed, seconds and errors
+        ([(path, message)] for files that could not be copied).
+    """
+    destination = _resolve_destination(source, destination)
+    # Opening the source itself for writing would truncate it
+    _check_not_same_file(source, destination)
+    if not os.path.isdir(source):
+        progress = CopyProgress(os.path.getsize(source), label)
+        copied = copy_file(source, destination, progress)
+        return {"destination": destination, "files": 1, "bytes": copied["bytes"],
+                "resumed": copied["resumed"], "seconds": progress.finish(), "errors": []}
+
+    if os.path.abspath(destination).startswith(os.path.abspath(source) + os.sep):
+        raise ValueError(f"Cannot copy '{source}' into itself.")
+    directories, files, links = _tree_plan(source, destination)
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+    progress = CopyProgress(sum(size for _, _, size in files), label)
+    totals = {"bytes": 0, "resumed": 0}
+    errors = []
+    lock = threading.Lock()
+
+    def copy_one(job):
+        file_source, file_target, _ = job
+        try:
+            copied = copy_file(file_source, file_target, progress)
+        except OSError as e:
+            with lock:
+                errors.append((file_source, str(e)))
+            return
+        with lock:
+            totals["bytes"] += copied["bytes"]
+            totals["resumed"] += copied["resumed"]
+
+    # Largest files first so one big file doesn't finish last on its own
+    files.sort(key=lambda job: job[2], reverse=True)
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS, thread_name_prefix="copy") as executor:
+        list(executor.map(copy_one, files))
+
+    for link_source, link_target in links:
+        try:
+            os.symlink(os.readlink(link_source), link_target)
+        except OSError as e:
+            errors.append((link_source, str(e)))
+    try:
+        shutil.copystat(source, destination)
+    except OSError:
+        pass
+
+    return {"destination": destination, "files": len(files) - len(errors), "bytes": totals["bytes"],
+            "resumed": totals["resumed"], "seconds": progress.finish(), "errors": errors}
+
+
+def move_path(source: str, destination: str) -> Dict[str, Any]:
+    """Move a file or directory: a rename on the same filesystem, otherwise copy then delete."""
+    destination = _resolve_destination(source, destination)
+    if os.path.normcase(os.path.abspath(source)) == os.path.normcase(os.path.abspath(destination)):
+        _check_not_same_file(source, destination)
+    # The same file under another name (a case-only rename) is renamed below
+    started = time.monotonic()
+    try:
+        os.rename(source, destination)
+        return {"destination": destination, "files": None, "bytes": 0, "resumed": 0,
+                "seconds": time.monotonic() - started, "errors": [], "renamed": True}
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    result = copy_path(source, destination, label="Moving")
+    if not result["errors"]:
+        if os.path.isdir(source) and not os.path.islink(source):
+            shutil.rmtree(source)
+        else:
+            os.remove(source)
+    result["renamed"] = False
+    return result
@@ -0,0 +1,102 @@
+"""
+Directory crawler shared by file listing, search and the file index.
+
+Entries come from os.scandir, so the file type (and on Windows the full stat
+data) is read from the directory listing itself instead of one extra stat
+call per entry. In recursive mode, subdirectories are scanned concurrently
+on a thread pool. Results are yielded as each directory finishes, so the
+caller sees output from huge trees right away.
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+
+CRAWL_WORKERS = min(16, (os.cpu_count() or 1) * 4)  # Scanning is I/O bound
+
+
+def is_directory(entry: os.DirEntry) -> bool:
+    """Whether an entry is a real directory (symlinks are not followed, so no loops)."""
+    try:
+        return entry.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
+
+
+def _prefetch_stat(entry: os.DirEntry):
+    """Fill the entry's stat cache."""
+    try:
+        entry.stat(follow_symlinks=False)
+    except OSError:
+        pass
+
+
+def _scan(path: str, prefetch_stat: bool, onerror: Optional[Callable]) -> List[os.DirEntry]:
+    """List one directory. Unreadable directories are skipped after calling onerror."""
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError as e:
+        if onerror is not None:
+            onerror(e)
+        return []
+    if prefetch_stat:
+        for entry in entries:
+            _prefetch_stat(entry)
+    return entries
+
+
+def walk_entries(roots: Union[str, Iterable[str]], recursive: bool = True,
+                 prefetch_stat: bool = False, onerror: Optional[Callable] = None,
+                 max_workers: int = CRAWL_WORKERS) -> Iterator[os.DirEntry]:
+    """Yield the DirEntry of everything under one or more directories.
+
+    Args:
+        roots: A directory or several directories to crawl.
+        recursive: Descend into subdirectories, scanning them in parallel.
+        prefetch_stat: Call entry.stat() on the worker threads so callers get
+                       cached stat results without blocking.
+        onerror: Called with the OSError of a directory that cannot be read,
+                 as with os.walk. It may raise to abort the crawl.
+        max_workers: Size of the scanning pool.
+
+    Entries of one directory are yielded together, but directories arrive in
+    the order they finish scanning. The roots themselves are not yielded.
+    """
+    if isinstance(roots, str):
+        roots = [roots]
+
+    if not recursive:
+        # A single directory is streamed straight from the listing
+        for root in roots:
+            try:
+                it = os.scandir(root)
+            except OSError as e:
+                if onerror is not None:
+                    onerror(e)
+                continue
+            with it:
+                for entry in it:
+                    if prefetch_stat:
+                        _prefetch_stat(entry)
+                    yield entry
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crawler")
+    pending = {executor.submit(_scan, root, prefetch_stat, onerror) for root in roots}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entries = future.result()
+                # Queue the subdirectories before yielding so the pool keeps working meanwhile
+                for entry in entries:
+                    if is_directory(entry):
+                        pending.add(executor.submit(_scan, entry.path, prefetch_stat, onerror))
+                yield from entries
+    finally:
+        # The caller may stop early: drop queued scans instead of finishing the crawl
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,485 @@
+"""
+Persistent filename index for the files module.
+
+The index is a SQLite database of every file and directory under a set of
+roots. Roots come from the FILE_INDEX_ROOTS environment variable (separated
+by os.pathsep). A searched directory outside every root becomes a root too,
+replacing any roots inside it; such roots are dropped again after
+ROOT_IDLE_LIMIT without queries.
+
+A root's first crawl scans the whole tree in parallel with the shared
+crawler. After that, roots are kept fresh incrementally by a background
+thread. A query also checks the directories below the queried path, unless
+they were checked in the last FRESHNESS_WINDOW seconds or a crawl is
+already running. A directory whose mtime has not changed since the last
+crawl keeps its stored entries and is not listed again, because adding,
+removing or renaming an entry is what changes a directory's mtime. The
+crawler still descends into its subdirectories.
+
+Each entry also stores its mtime in a B-tree index, so date-range and "most
+recent" queries walk only the matching part of the index instead of
+comparing every file. Editing a file in place does not change its
+directory's mtime. Edits made through the files module reach the index at
+once (through the directory watcher); other edits are picked up by the
+background refresh, which re-stats every root once per RESTAT_INTERVAL,
+writing only the rows that changed.
+"""
+
+import difflib
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils.crawler import is_directory, walk_entries
+from utils.sqlite_store import connect_sqlite
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY,
+    crawled_at REAL NOT NULL DEFAULT 0,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_parent ON entries(parent);
+CREATE INDEX IF NOT EXISTS idx_entries_name ON entries(name_lower);
+"""
+
+# Created after the migration below, since older databases lack the mtime column
+MTIME_INDEX = "CREATE INDEX IF NOT EXISTS idx_entries_mtime ON entries(mtime)"
+
+INSERT_ENTRY = "INSERT OR REPLACE INTO entries (path, parent, name, name_lower, is_dir, mtime) VALUES (?, ?, ?, ?, ?, ?)"
+
+REFRESH_INTERVAL = 300  # seconds between background refreshes of every root
+RESTAT_INTERVAL = 600  # seconds between refreshes that also re-stat unchanged directories
+FRESHNESS_WINDOW = 30  # seconds a query trusts a subtree checked by an earlier query or crawl
+ROOT_IDLE_LIMIT = 30 * 24 * 60 * 60  # seconds before an unused root added by a search is dropped
+MATCH_MODES = ("exact", "substring", "glob", "fuzzy")
+FUZZY_CANDIDATES = 2000  # Subsequence matches scored by difflib in fuzzy mode
+
+
+def normalize_path(path: str) -> str:
+    """Absolute path without a trailing separator, as stored in the index."""
+    return os.path.normpath(os.path.abspath(os.path.expanduser(path)))
+
+
+def _is_within(path: str, root: str) -> bool:
+    """Whether path is root or lies below it (case-insensitive where the filesystem is)."""
+    path, root = os.path.normcase(path), os.path.normcase(root)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _entry_row(path: str, parent: str, name: str, is_dir: bool, mtime: Optional[float]):
+    """Row for the entries table."""
+    return (path, parent, name, name.lower(), int(is_dir), mtime)
+
+
+def _entry_mtime(entry: os.DirEntry) -> Optional[float]:
+    """An entry's mtime without following symlinks, or None if it can't be read."""
+    try:
+        return entry.stat(follow_symlinks=False).st_mtime
+    except OSError:
+        return None
+
+
+def _subtree_bounds(path: str):
+    """Range of stored paths strictly inside a directory, usable with the path index.
+
+    The exclusive upper bound replaces the trailing separator with the next
+    character, so it sorts after every name below the directory, including
+    names starting with characters outside the Basic Multilingual Plane.
+    """
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class FileIndex:
+    """SQLite-backed index of file and directory names under a set of roots."""
+
+    def __init__(self, db_file: str = None):
+        if db_file is None:
+            # Default to file_index.db in the utils directory
+            utils_dir = os.path.dirname(os.path.abspath(__file__))
+            db_file = os.path.join(utils_dir, 'file_index.db')
+
+        self.db_file = db_file
+        # One crawl at a time; queries only wait on it for a root's first crawl
+        self.crawl_lock = threading.Lock()
+        self._background_thread = None
+        self._restat_at = {}  # root -> time of its last full re-stat
+        self._checked_at = {}  # directory -> time its subtree was last checked for changes
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(entries)")]
+            if "mtime" not in columns:
+                # Databases from before date queries: add the column and re-stat every directory
+                conn.execute("ALTER TABLE entries ADD COLUMN mtime REAL")
+                conn.execute("DELETE FROM dirs")
+            conn.execute(MTIME_INDEX)
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(roots)")]
+            if "pinned" not in columns:
+                # Databases from before roots expired: keep the existing roots for now
+                conn.execute("ALTER TABLE roots ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+                conn.execute("ALTER TABLE roots ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE roots SET last_used = ?", (time.time(),))
+        for root in os.getenv('FILE_INDEX_ROOTS', '').split(os.pathsep):
+            if root.strip() and os.path.isdir(root.strip()):
+                self.add_root(root.strip(), pinned=True)
+
+    def _connect(self):
+        return connect_sqlite(self.db_file)
+
+    def add_root(self, path: str, pinned: bool = False) -> str:
+        """Register a directory tree to be indexed and return the root covering it.
+
+        A path inside an existing root only marks that root as used. A new
+        root replaces the roots inside it, so roots never overlap. Pinned
+        roots (from FILE_INDEX_ROOTS) are never dropped for being unused.
+        """
+        path = normalize_path(path)
+        now = time.time()
+        with self._connect() as conn:
+            roots = {row["path"]: row["pinned"] for row in conn.execute("SELECT path, pinned FROM roots")}
+            root = next((root for root in roots if _is_within(path, root)), None)
+            if root is not None:
+                conn.execute("UPDATE roots SET last_used = ?, pinned = max(pinned, ?) WHERE path = ?",
+                             (now, int(pinned), root))
+                return root
+            # The inner roots' entries are rewritten by the new root's first crawl
+            nested = [root for root in roots if _is_within(root, path)]
+            pinned = pinned or any(roots[root] for root in nested)
+            conn.executemany("DELETE FROM roots WHERE path = ?", [(root,) for root in nested])
+            conn.execute("INSERT INTO roots (path, pinned, last_used) VALUES (?, ?, ?)", (path, int(pinned), now))
+        return path
+
+    def remove_root(self, root: str):
+        """Stop indexing a root and drop its entries."""
+        with self.crawl_lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM roots WHERE path = ?", (root,))
+                self._remove_subtree(conn, root)
+            self._restat_at.pop(root, None)
+
+    def roots(self) -> Dict[str, float]:
+        """Indexed roots mapped to the time of their last completed crawl (0 if never)."""
+        with self._connect() as conn:
+            return {row["path"]: row["crawled_at"] for row in conn.execute("SELECT * FROM roots")}
+
+    def covering_root(self, path: str) -> Optional[str]:
+        """The indexed root that contains path, if any."""
+        path = normalize_path(path)
+        for root in self.roots():
+            if _is_within(path, root):
+                return root
+        return None
+
+    def _as_stored(self, path: str) -> str:
+        """path with its covering root spelled as stored, so a differently cased
+        path on a case-insensitive filesystem matches the stored paths."""
+        path = normalize_path(path)
+        root = self.covering_root(path)
+        return path if root is None else root + path[len(root):]
+
+    def _remove_subtree(self, conn, path: str):
+        """Drop a directory's descendants (used when it disappeared or was replaced)."""
+        low, high = _subtree_bounds(path)
+        conn.execute("DELETE FROM entries WHERE path > ? AND path < ?", (low, high))
+        conn.execute("DELETE FROM dirs WHERE path = ? OR (path > ? AND path < ?)", (path, low, high))
+
+    def _index_directory(self, conn, path: str, restat: bool = False) -> List[str]:
+        """Refresh one directory's entries if its mtime changed (or always with restat).
+        Returns its subdirectories."""
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self._remove_subtree(conn, path)
+            return []
+
+        row = conn.execute("SELECT mtime FROM dirs WHERE path = ?", (path,)).fetchone()
+        if not restat and row is not None and row["mtime"] == mtime:
+            return [r["path"] for r in conn.execute(
+                "SELECT path FROM entries WHERE parent = ? AND is_dir = 1", (path,))]
+
+        try:
+            with os.scandir(path) as it:
+                scanned = []
+                for entry in it:
+                    scanned.append(_entry_row(entry.path, path, entry.name, is_directory(entry), _entry_mtime(entry)))
+        except OSError:
+            return []
+
+        # Write only what changed, so re-statting an unchanged tree costs no writes
+        current = {entry[0] for entry in scanned}
+        previous = {row["path"]: (row["is_dir"], row["mtime"]) for row in conn.execute(
+            "SELECT path, is_dir, mtime FROM entries WHERE parent = ?", (path,))}
+        for old_path, (old_is_dir, _) in previous.items():
+            if old_path not in current:
+                conn.execute("DELETE FROM entries WHERE path = ?", (old_path,))
+                if old_is_dir:
+                    self._remove_subtree(conn, old_path)
+        conn.executemany(INSERT_ENTRY, [entry for entry in scanned if previous.get(entry[0]) != (entry[4], entry[5])])
+        conn.execute("INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)", (path, mtime))
+        return [entry[0] for entry in scanned if entry[4]]
+
+    def _full_crawl(self, root: str):
+        """Index a root that has never been crawled, scanning subdirectories in parallel."""
+        unreadable = set()
+        with self._connect() as conn:
+            self._remove_subtree(conn, root)
+            dirs = {root: os.stat(root).st_mtime}
+            rows = []
+            entries = walk_entries(root, prefetch_stat=True, onerror=lambda e: unreadable.add(e.filename))
+            for entry in entries:
+                is_dir = is_directory(entry)
+                mtime = _entry_mtime(entry)
+                rows.append(_entry_row(entry.path, os.path.dirname(entry.path), entry.name, is_dir, mtime))
+                if is_dir and mtime is not None:
+                    dirs[entry.path] = mtime
+                if len(rows) >= 5000:
+                    conn.executemany(INSERT_ENTRY, rows)
+                    rows = []
+            conn.executemany(INSERT_ENTRY, rows)
+            # Unreadable directories get no mtime, so incremental crawls keep retrying them
+            conn.executemany("INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)",
+                             [(path, mtime) for path, mtime in dirs.items() if path not in unreadable])
+
+    def _refresh_from(self, path: str, restat: bool):
+        """Check every directory under path, re-reading those whose mtime changed. Caller holds crawl_lock."""
+        pending = [path]
+        while pending:
+            # One transaction per batch of directories keeps commits cheap
+            with self._connect() as conn:
+                for _ in range(min(len(pending), 500)):
+                    pending.extend(self._index_directory(conn, pending.pop(), restat))
+        self._mark_checked(path)
+
+    def _mark_checked(self, path: str):
+        """Record that a subtree was just checked, replacing the records of directories inside it."""
+        for checked in list(self._checked_at):
+            if _is_within(checked, path):
+                self._checked_at.pop(checked, None)
+        self._checked_at[path] = time.time()
+
+    def is_fresh(self, path: str) -> bool:
+        """Whether path's subtree was checked for changes in the last FRESHNESS_WINDOW seconds."""
+        cutoff = time.time() - FRESHNESS_WINDOW
+        return any(checked_at > cutoff and _is_within(path, checked)
+                   for checked, checked_at in list(self._checked_at.items()))
+
+    def refresh_subtree(self, path: str):
+        """Bring the index up to date below one directory of a crawled root.
+
+        Costs one stat per directory; only directories whose mtime changed
+        (an entry was added, removed or renamed) are listed again. Skipped
+        when the subtree was checked within FRESHNESS_WINDOW, and when a
+        crawl is running, since that crawl is refreshing it already.
+        """
+        path = normalize_path(path)
+        if self.is_fresh(path) or not self.crawl_lock.acquire(blocking=False):
+            return
+        try:
+            self._refresh_from(path, restat=False)
+        finally:
+            self.crawl_lock.release()
+
+    def crawl(self, root: str, restat: bool = False):
+        """Bring the index of one root up to date.
+        With restat, unchanged directories are re-read too, refreshing file mtimes."""
+        root = normalize_path(root)
+        with self.crawl_lock:
+            with self._connect() as conn:
+                known = conn.execute("SELECT 1 FROM dirs WHERE path = ?", (root,)).fetchone()
+            if known:
+                self._refresh_from(root, restat)
+            else:
+                self._full_crawl(root)
+                self._mark_checked(root)
+            if restat or not known:
+                self._restat_at[root] = time.time()
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO roots (path, crawled_at) VALUES (?, ?)", (root, time.time()))
+                conn.execute("PRAGMA optimize")  # Keeps the planner's index statistics current
+
+    def apply_change(self, path: str):
+        """Update the index for one path reported as created, modified, moved or deleted.
+
+        Only paths under an indexed root are recorded. A new directory's
+        contents are picked up by the next crawl.
+        """
+        path = normalize_path(path)
+        if self.covering_root(path) is None:
+            return
+        parent, name = os.path.split(path)
+        with self._connect() as conn:
+            try:
+                stat_result = os.lstat(path)
+            except OSError:
+                stat_result = None
+            if stat_result is not None:
+                is_dir = os.path.isdir(path) and not os.path.islink(path)
+                conn.execute(INSERT_ENTRY, _entry_row(path, parent, name, is_dir, stat_result.st_mtime))
+            else:
+                conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+                self._remove_subtree(conn, path)
+
+    def refresh_all(self):
+        """Crawl every registered root, re-statting those not re-statted for RESTAT_INTERVAL.
+        Roots added by searches and unused for ROOT_IDLE_LIMIT are dropped instead."""
+        with self._connect() as conn:
+            idle = [row["path"] for row in conn.execute(
+                "SELECT path FROM roots WHERE pinned = 0 AND last_used < ?", (time.time() - ROOT_IDLE_LIMIT,))]
+        for root in idle:
+            try:
+                self.remove_root(root)
+            except Exception as e:
+                print(f"Warning: Could not drop unused index root {root}: {e}")
+        for root in self.roots():
+            try:
+                restat = time.time() - self._restat_at.get(root, 0) > RESTAT_INTERVAL
+                self.crawl(root, restat)
+            except Exception as e:
+                print(f"Warning: Could not index {root}: {e}")
+
+    def start_background_indexing(self):
+        """Start the daemon thread that refreshes all roots every REFRESH_INTERVAL seconds."""
+        if self._background_thread is not None and self._background_thread.is_alive():
+            return
+
+        def run():
+            while True:
+                self.refresh_all()
+                time.sleep(REFRESH_INTERVAL)
+
+        self._background_thread = threading.Thread(target=run, name="file-indexer", daemon=True)
+        self._background_thread.start()
+
+    def ensure_indexed(self, path: str) -> str:
+        """Make sure the index is current below path and return the root covering it.
+
+        A directory outside every root is registered and crawled right away.
+        Otherwise the directories below path are checked for changes first
+        (see refresh_subtree), so answers miss files created or deleted by
+        other programs for at most FRESHNESS_WINDOW seconds.
+        """
+        root = self.add_root(path)
+        if not self.roots().get(root, 0):
+            self.crawl(root)
+        else:
+            self.refresh_subtree(path)
+        return root
+
+    def search(self, path: str, query: str, mode: str = "exact", limit: int = 50) -> List[str]:
+        """Paths under `path` whose name matches the query (case-insensitive).
+
+        Modes: exact name, substring, glob pattern (* ? [..]), or fuzzy
+        (characters in order, ranked by similarity).
+        """
+        path = self._as_stored(path)
+        low, high = _subtree_bounds(path)
+        query_lower = query.lower()
+        scope = "path > ? AND path < ?"
+
+        with self._connect() as conn:
+            if mode == "exact":
+                rows = conn.execute(
+                    f"SELECT path FROM entries WHERE name_lower = ? AND {scope} ORDER BY path LIMIT ?",
+                    (query_lower, low, high, limit))
+            elif mode == "substring":
+                rows = conn.execute(
+                    f"SELECT path FROM entries WHERE instr(name_lower, ?) > 0 AND {scope} "
+                    "ORDER BY length(name), path LIMIT ?",
+                    (query_lower, low, high, limit))
+            elif mode == "glob":
+                rows = conn.execute(
+                    f"SELECT path FROM entries WHERE name_lower GLOB ? AND {scope} ORDER BY path LIMIT ?",
+                    (query_lower, low, high, limit))
+            elif mode == "fuzzy":
+                pattern = "%" + "%".join(
+                    c.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for c in query_lower) + "%"
+                candidates = conn.execute(
+                    f"SELECT path, name_lower FROM entries WHERE name_lower LIKE ? ESCAPE '\\' AND {scope} LIMIT ?",
+                    (pattern, low, high, FUZZY_CANDIDATES)).fetchall()
+                ranked = sorted(
+                    candidates,
+                    key=lambda r: difflib.SequenceMatcher(None, query_lower, r["name_lower"]).ratio(),
+                    reverse=True)
+                return [r["path"] for r in ranked[:limit]]
+            else:
+                raise ValueError(f"Unknown match mode '{mode}'. Use one of: {', '.join(MATCH_MODES)}")
+            return [r["path"] for r in rows]
+
+    def modified_between(self, paths: List[str], start: Optional[float] = None, end: Optional[float] = None,
+                         limit: Optional[int] = None, recursive: bool = True) -> List[Dict]:
+        """Entries under the given directories modified in [start, end), newest first.
+
+        A date range or top-N "most recent" query walks the mtime index from
+        the newest matching entry down, so it reads roughly the rows it
+        returns (plus recent entries outside the scope) instead of the whole
+        tree.
+
+        Args:
+            paths: Directories to search (roots of the query, not necessarily indexed roots).
+            start: Earliest mtime (inclusive), or None for no lower bound.
+            end: Latest mtime (exclusive), or None for no upper bound.
+            limit: Return at most this many entries.
+            recursive: Include entries in subdirectories, or only direct children.
+
+        Returns:
+            Dicts with path, name, is_dir and modified.
+        """
+        conditions = ["mtime IS NOT NULL"]
+        params: List = []
+        if start is not None:
+            conditions.append("mtime >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("mtime < ?")
+            params.append(end)
+
+        scopes = []
+        for path in paths:
+            path = self._as_stored(path)
+            if recursive:
+                scopes.append("(path > ? AND path < ?)")
+                params.extend(_subtree_bounds(path))
+            else:
+                scopes.append("parent = ?")
+                params.append(path)
+        conditions.append("(" + " OR ".join(scopes) + ")")
+
+        # Date ranges and top-N queries walk the mtime index from the newest entry
+        # down; a plain listing leaves the choice to the planner (usually the path index)
+        indexed_by = "INDEXED BY idx_entries_mtime " if start is not None or limit is not None else ""
+        sql = (f"SELECT path, name, is_dir, mtime FROM entries {indexed_by}"
+               f"WHERE {' AND '.join(conditions)} ORDER BY mtime DESC")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{"path": r["path"], "name": r["name"], "is_dir": bool(r["is_dir"]), "modified": r["mtime"]}
+                for r in rows]
+
+
+# Global instance for easy access
+_file_index = None
+
+def get_file_index() -> FileIndex:
+    """Get the global file index instance."""
+    global _file_index
+    if _file_index is None:
+        _file_index = FileIndex()
+    return _file_index
@@ -0,0 +1,215 @@
+"""
+Filesystem watcher that keeps directory metadata in memory.
+
+The first `files list` of a directory scans it once. After that the
+directory is watched, and its entries (name, type, times, size) are kept in
+memory and updated from change events, so later listings and date filters
+only stat the directory itself. The files module also reports its own
+changes right away. With the optional watchdog package, events come from
+the OS (inotify, ReadDirectoryChangesW, FSEvents). Without it, a background
+thread polls the watched directories instead: it rescans a directory as
+soon as its mtime changes, and every directory once per FULL_RESCAN_INTERVAL
+to pick up files edited in place.
+
+Change events are also passed to the persistent file index, so search sees
+new and deleted files in watched directories right away.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from utils.crawler import walk_entries
+from utils.file_index import get_file_index, normalize_path
+
+
+WATCH_LIMIT = 32  # Directories kept in memory; the least recently listed is dropped
+POLL_INTERVAL = 5  # Seconds between polls when watchdog is not installed
+FULL_RESCAN_INTERVAL = 60  # Polling also rescans unchanged directories this often (catches edits in place)
+
+
+def _raise(error):
+    raise error
+
+
+def entry_metadata(name: str, stat_result, is_dir: bool) -> Dict[str, Any]:
+    """Metadata kept for one directory entry."""
+    return {
+        "name": name,
+        "is_dir": is_dir,
+        "created": stat_result.st_ctime,
+        "modified": stat_result.st_mtime,
+        "size": stat_result.st_size,
+    }
+
+
+def scan_metadata(path: str) -> Dict[str, Dict[str, Any]]:
+    """Read the metadata of every entry in a directory (raises OSError if unreadable)."""
+    entries = {}
+    for entry in walk_entries(path, recursive=False, onerror=_raise):
+        try:
+            entries[entry.name] = entry_metadata(entry.name, entry.stat(), entry.is_dir())
+        except OSError:
+            # Broken symlinks and the like are still listed
+            entries[entry.name] = {"name": entry.name, "is_dir": False, "created": None, "modified": None, "size": None}
+    return entries
+
+
+class _EventHandler:
+    """watchdog event handler; the observer only calls dispatch()."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def dispatch(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        self.watcher.apply_change(event.src_path)
+        if event.event_type == "moved":
+            self.watcher.apply_change(event.dest_path)
+
+
+class DirectoryWatcher:
+    """In-memory metadata cache for recently listed directories."""
+
+    def __init__(self, limit: int = WATCH_LIMIT):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # directory -> {name: metadata}
+        self.scanned_at = {}  # directory -> (directory mtime, scan time)
+        self.backend = None  # "watchdog" or "polling" once the first directory is watched
+        self._observer = None
+        self._watches = {}
+        self._poller = None
+
+    def listing(self, path: str) -> List[Dict[str, Any]]:
+        """Metadata of every entry in a directory, from memory when it is watched.
+
+        The cached entries are only served while the directory's mtime is
+        unchanged, so added, removed and renamed entries show up at once even
+        before their change event arrives. Files edited in place by other
+        programs show up when their event arrives, or with the polling
+        backend at the next full rescan.
+        """
+        path = normalize_path(path)
+        directory_mtime = os.stat(path).st_mtime
+        with self.lock:
+            if path in self.cache:
+                known_mtime, _ = self.scanned_at[path]
+                if directory_mtime == known_mtime:
+                    self.cache.move_to_end(path)
+                    return [dict(meta) for meta in self.cache[path].values()]
+            # Watch before scanning so changes made during the scan are not missed
+            self._watch(path)
+        try:
+            entries = scan_metadata(path)
+        except OSError:
+            with self.lock:
+                self.cache.pop(path, None)
+                self.scanned_at.pop(path, None)
+                self._unwatch(path)
+            raise
+        with self.lock:
+            self.cache[path] = entries
+            self.cache.move_to_end(path)
+            self.scanned_at[path] = (directory_mtime, time.time())
+            while len(self.cache) > self.limit:
+                evicted, _ = self.cache.popitem(last=False)
+                self.scanned_at.pop(evicted, None)
+                self._unwatch(evicted)
+        return [dict(meta) for meta in entries.values()]
+
+    def apply_change(self, path: str):
+        """Refresh the cached entry for one changed path and pass the change to the file index."""
+        if isinstance(path, bytes):
+            path = os.fsdecode(path)
+        path = normalize_path(path)
+        parent, name = os.path.split(path)
+        try:
+            stat_result = os.stat(path, follow_symlinks=False)
+        except OSError:
+            stat_result = None
+
+        with self.lock:
+            entries = self.cache.get(parent)
+            if entries is not None and name:
+                if stat_result is None:
+                    entries.pop(name, None)
+                else:
+                    entries[name] = entry_metadata(name, stat_result, os.path.isdir(path))
+            if stat_result is None and path in self.cache:
+                del self.cache[path]
+                self.scanned_at.pop(path, None)
+                self._unwatch(path)
+
+        try:
+            get_file_index().apply_change(path)
+        except Exception as e:
+            print(f"Warning: Could not update file index for {path}: {e}")
+
+    def _watch(self, path: str):
+        """Start receiving changes for a directory. Caller holds the lock."""
+        if self.backend is None:
+            self._start_backend()
+        if self.backend == "watchdog" and path not in self._watches:
+            try:
+                self._watches[path] = self._observer.schedule(_EventHandler(self), path, recursive=False)
+            except Exception as e:
+                print(f"Warning: Could not watch {path}, it will be rescanned instead: {e}")
+
+    def _unwatch(self, path: str):
+        """Stop receiving changes for a directory. Caller holds the lock."""
+        watch = self._watches.pop(path, None)
+        if watch is not None:
+            try:
+                self._observer.unschedule(watch)
+            except Exception:
+                pass
+
+    def _start_backend(self):
+        """Use watchdog when it is installed, polling otherwise."""
+        try:
+            from watchdog.observers import Observer
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+            self.backend = "watchdog"
+        except ImportError:
+            self._poller = threading.Thread(target=self._poll_loop, name="fs-watcher-poll", daemon=True)
+            self._poller.start()
+            self.backend = "polling"
+
+    def _poll_loop(self):
+        """Rescan watched directories whose mtime changed, and all of them now and then."""
+        while True:
+            time.sleep(POLL_INTERVAL)
+            with self.lock:
+                watched = list(self.scanned_at.items())
+            for path, (known_mtime, scanned_at) in watched:
+                try:
+                    directory_mtime = os.stat(path).st_mtime
+                    if directory_mtime == known_mtime and time.time() - scanned_at < FULL_RESCAN_INTERVAL:
+                        continue
+                    entries = scan_metadata(path)
+                except OSError:
+                    with self.lock:
+                        self.cache.pop(path, None)
+                        self.scanned_at.pop(path, None)
+                    continue
+                with self.lock:
+                    if path in self.cache:
+                        self.cache[path] = entries
+                        self.scanned_at[path] = (directory_mtime, time.time())
+
+
+# Global instance for easy access
+_directory_watcher = None
+
+def get_directory_watcher() -> DirectoryWatcher:
+    """Get the global directory watcher instance."""
+    global _directory_watcher
+    if _directory_watcher is None:
+        _directory_watcher = DirectoryWatcher()
+    return _directory_watcher
@@ -0,0 +1,251 @@
+"""
+Local mailbox cache for the Gmail module.
+
+Messages are stored in a SQLite database keyed by Gmail message ID together
+with their labels and decoded body, plus the Gmail historyId the cache is
+synced to. The Gmail module uses the historyId to fetch only changes since
+the last sync, and serves reads and searches from this cache.
+
+Subject, sender and body are also kept in an FTS5 full-text index (kept in
+step with the messages table by triggers) so searches return ranked hits
+with snippets. Without FTS5 support, search falls back to LIKE matching.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.sqlite_store import connect_sqlite
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER NOT NULL DEFAULT 0,
+    labels TEXT NOT NULL DEFAULT ',',
+    subject TEXT,
+    sender TEXT,
+    date TEXT,
+    snippet TEXT,
+    body TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_internal_date ON messages(internal_date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over the message rows; rowids match messages.rowid
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE messages_fts USING fts5(
+    subject, sender, body, tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, subject, sender, body)
+    VALUES (new.rowid, new.subject, new.sender, COALESCE(new.body, new.snippet));
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF subject, sender, body, snippet ON messages BEGIN
+    UPDATE messages_fts SET subject = new.subject, sender = new.sender, body = COALESCE(new.body, new.snippet)
+    WHERE rowid = old.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    DELETE FROM messages_fts WHERE rowid = old.rowid;
+END;
+INSERT INTO messages_fts (rowid, subject, sender, body)
+    SELECT rowid, subject, sender, COALESCE(body, snippet) FROM messages;
+"""
+
+# Column weights for bm25(): a subject hit outranks a sender hit outranks a body hit
+FTS_WEIGHTS = (5.0, 3.0, 1.0)
+
+
+def _encode_labels(label_ids: Iterable[str]) -> str:
+    """Store labels as ',A,B,' so a label can be matched with LIKE '%,A,%'."""
+    return "," + ",".join(label_ids or []) + ","
+
+
+class MailCache:
+    """SQLite-backed store of Gmail messages and sync state."""
+
+    def __init__(self, db_file: str = None):
+        if db_file is None:
+            # Default to gmail_cache.db in the utils directory
+            utils_dir = os.path.dirname(os.path.abspath(__file__))
+            db_file = os.path.join(utils_dir, 'gmail_cache.db')
+
+        self.db_file = db_file
+        self.lock = threading.RLock()  # Serializes syncs; reads use their own connections
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self.has_fts = self._ensure_fts()
+
+    def _ensure_fts(self) -> bool:
+        """Create (and fill) the full-text index if needed. Returns False without FTS5."""
+        with self._connect() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+            ).fetchone()
+            if exists:
+                return True
+            try:
+                conn.executescript("BEGIN;" + FTS_SCHEMA + "COMMIT;")
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                print(f"Warning: SQLite FTS5 unavailable, email search falls back to plain matching: {e}")
+                return False
+        return True
+
+    def _connect(self):
+        return connect_sqlite(self.db_file)
+
+    def get_state(self, key: str) -> Optional[str]:
+        """Get a sync state value such as the stored historyId."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, key: str, value: str):
+        """Set a sync state value."""
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def store_message(self, message: Dict[str, Any]):
+        """Insert or replace a message.
+
+        Args:
+            message: dict with id, thread_id, internal_date, label_ids, subject,
+                     sender, date, snippet and body (None when not fetched).
+        """
+        self.store_messages([message])
+
+    def store_messages(self, messages: List[Dict[str, Any]]):
+        """Insert or replace several messages in one transaction."""
+        rows = [
+            (
+                m["id"], m.get("thread_id"), int(m.get("internal_date") or 0),
+                _encode_labels(m.get("label_ids")), m.get("subject"), m.get("sender"),
+                m.get("date"), m.get("snippet"), m.get("body"),
+            )
+            for m in messages
+        ]
+        # An upsert (not INSERT OR REPLACE) keeps the rowid, so the index triggers see an update
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO messages "
+                "(id, thread_id, internal_date, labels, subject, sender, date, snippet, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET thread_id = excluded.thread_id, "
+                "internal_date = excluded.internal_date, labels = excluded.labels, "
+                "subject = excluded.subject, sender = excluded.sender, date = excluded.date, "
+                "snippet = excluded.snippet, body = COALESCE(excluded.body, messages.body)",
+                rows,
+            )
+
+    def delete_messages(self, message_ids: Iterable[str]):
+        """Remove messages from the cache."""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM messages WHERE id = ?", [(i,) for i in message_ids])
+
+    def set_labels(self, message_id: str, label_ids: Iterable[str]):
+        """Replace the labels of a cached message."""
+        with self._connect() as conn:
+            conn.execute("UPDATE messages SET labels = ? WHERE id = ?", (_encode_labels(label_ids), message_id))
+
+    def known_ids(self, message_ids: Iterable[str]) -> set:
+        """Return the subset of message_ids already in the cache."""
+        message_ids = list(message_ids)
+        known = set()
+        with self._connect() as conn:
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT id FROM messages WHERE id IN ({placeholders})", chunk)
+                known.update(row["id"] for row in rows)
+        return known
+
+    def count_label(self, label: str) -> int:
+        """Number of cached messages carrying a label."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT COUNT(*) AS n FROM messages WHERE labels LIKE ?", (f"%,{label},%",)).fetchone()
+        return row["n"]
+
+    def recent(self, label: str, count: int) -> List[Dict[str, Any]]:
+        """Newest cached messages carrying a label."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM messages WHERE labels LIKE ? ORDER BY internal_date DESC LIMIT ?",
+                (f"%,{label},%", count),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """A cached message by ID, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _fts_query(words: List[str], operator: str) -> str:
+        """Build an FTS5 query of quoted prefix terms, so user input can't break the syntax."""
+        terms = ['"' + word.replace('"', '""') + '"*' for word in words]
+        return f" {operator} ".join(terms)
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Best matches for the query in subject, sender and body.
+
+        Results are ranked by bm25 and carry a 'hit' snippet around the match.
+        Messages containing every word are preferred; if there are none, any
+        word may match.
+        """
+        words = query.split()
+        if not words:
+            return []
+        if not self.has_fts:
+            return self._search_like(words, limit)
+
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        sql = (
+            "SELECT m.*, snippet(messages_fts, 2, '[', ']', '...', 24) AS hit "
+            "FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid "
+            f"WHERE messages_fts MATCH ? ORDER BY bm25(messages_fts, {weights}) LIMIT ?"
+        )
+        with self._connect() as conn:
+            rows = conn.execute(sql, (self._fts_query(words, "AND"), limit)).fetchall()
+            if not rows and len(words) > 1:
+                rows = conn.execute(sql, (self._fts_query(words, "OR"), limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def _search_like(self, words: List[str], limit: int) -> List[Dict[str, Any]]:
+        """Newest messages whose subject, sender or body contain every word."""
+        clauses = []
+        params: List[Any] = []
+        for word in words:
+            clauses.append("(subject LIKE ? OR sender LIKE ? OR COALESCE(body, snippet) LIKE ?)")
+            params.extend([f"%{word}%"] * 3)
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM messages WHERE {' AND '.join(clauses)} ORDER BY internal_date DESC LIMIT ?",
+                params,
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def clear(self):
+        """Drop every cached message and the sync state (forces a full resync)."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM messages")  # The delete trigger empties the index too
+            conn.execute("DELETE FROM sync_state")
+
+
+# Global instance for easy access
+_mail_cache = None
+
+def get_mail_cache() -> MailCache:
+    """Get the global mail cache instance."""
+    global _mail_cache
+    if _mail_cache is None:
+        _mail_cache = MailCache()
+    return _mail_cache
@@ -0,0 +1,176 @@
+"""
+Mirror health table for the torrent module.
+
+For every search endpoint (a mirror plus one of its URL formats) this keeps
+the number of attempts and successes, whether the last answer was a
+JavaScript wall, and an exponentially weighted moving average (EWMA) of the
+response latency. The table is saved to a JSON file so it survives restarts.
+
+Searches ask rank() for the order to try endpoints in. Endpoints that have
+been fast and reliable come first. An endpoint that fails or returns a JS
+wall is put on cool-down, and the cool-down doubles with each failure in a
+row, so a mirror that has been broken for weeks is rarely tried. A page with
+neither results nor a "no hits" message (a parked domain or challenge page)
+is a soft failure: the endpoint is tried after every endpoint whose last
+answer was real, and cools down after SOFT_FAILURE_LIMIT of them in a row.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+EWMA_WEIGHT = 0.3  # Weight of the newest latency sample
+DEFAULT_LATENCY = 3.0  # Seconds assumed for endpoints that never answered
+BASE_COOLDOWN = 60  # Seconds an endpoint is skipped after its first failure
+MAX_COOLDOWN = 24 * 60 * 60  # Cool-down stops doubling here
+SOFT_FAILURE_LIMIT = 3  # Unrecognized pages in a row before an endpoint is put on cool-down
+
+OUTCOMES = ("ok", "empty", "unrecognized", "js_wall", "error")
+
+
+def endpoint_key(mirror: str, url_format: int) -> str:
+    return f"{mirror}|{url_format}"
+
+
+def new_record() -> Dict[str, Any]:
+    return {
+        "attempts": 0,
+        "successes": 0,
+        "js_wall": False,
+        "latency": None,  # EWMA in seconds
+        "failures_in_row": 0,
+        "soft_failures_in_row": 0,  # Unrecognized pages since the last real answer
+        "cooldown_until": 0,
+        "last_checked": None,
+    }
+
+
+class MirrorHealth:
+    """Per-endpoint success rate, JS-wall flag, latency and cool-down."""
+
+    def __init__(self, health_file: str = None):
+        if health_file is None:
+            # Default to mirror_health.json in the utils directory
+            utils_dir = os.path.dirname(os.path.abspath(__file__))
+            health_file = os.path.join(utils_dir, 'mirror_health.json')
+
+        self.health_file = health_file
+        self.lock = threading.Lock()
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """Load the table from the JSON file."""
+        if os.path.exists(self.health_file):
+            try:
+                with open(self.health_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.endpoints = {key: {**new_record(), **record}
+                                  for key, record in data.get('endpoints', {}).items()}
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"Warning: Could not load mirror health from {self.health_file}: {e}")
+                self.endpoints = {}
+
+    def save(self):
+        """Save the table to the JSON file if anything changed since the last save."""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {'endpoints': {key: dict(record) for key, record in self.endpoints.items()}}
+            self.dirty = False
+        try:
+            temp_file = self.health_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp_file, self.health_file)
+        except Exception as e:
+            print(f"Warning: Could not save mirror health to {self.health_file}: {e}")
+
+    def record(self, mirror: str, url_format: int, outcome: str, latency: float = None):
+        """Record the result of one request.
+
+        Args:
+            outcome: 'ok' (results), 'empty' (a valid page saying nothing matched),
+                     'unrecognized' (neither results nor a "no hits" message, e.g.
+                     a parked domain), 'js_wall' or 'error' (failed request,
+                     timeout or bad status).
+            latency: Seconds until the page was downloaded, for 'ok' and 'empty'.
+        """
+        if outcome not in OUTCOMES:
+            raise ValueError(f"Unknown outcome '{outcome}'")
+        now = time.time()
+        with self.lock:
+            record = self.endpoints.setdefault(endpoint_key(mirror, url_format), new_record())
+            record["attempts"] += 1
+            record["last_checked"] = now
+            record["js_wall"] = outcome == "js_wall"
+            if outcome == "unrecognized":
+                # A soft failure: the endpoint drops behind every endpoint whose last
+                # answer was real, and only cools down after SOFT_FAILURE_LIMIT in a row
+                record["soft_failures_in_row"] += 1
+                if record["soft_failures_in_row"] >= SOFT_FAILURE_LIMIT:
+                    record["failures_in_row"] += 1
+                    cooldown = min(BASE_COOLDOWN * 2 ** (record["failures_in_row"] - 1), MAX_COOLDOWN)
+                    record["cooldown_until"] = now + cooldown
+            elif outcome in ("ok", "empty"):
+                record["successes"] += 1
+                record["failures_in_row"] = 0
+                record["soft_failures_in_row"] = 0
+                record["cooldown_until"] = 0
+                if latency is not None:
+                    previous = record["latency"]
+                    record["latency"] = latency if previous is None else (
+                        EWMA_WEIGHT * latency + (1 - EWMA_WEIGHT) * previous)
+            else:
+                record["failures_in_row"] += 1
+                cooldown = min(BASE_COOLDOWN * 2 ** (record["failures_in_row"] - 1), MAX_COOLDOWN)
+                record["cooldown_until"] = now + cooldown
+            self.dirty = True
+
+    def is_known(self, mirror: str, url_format: int) -> bool:
+        """Whether an endpoint has been tried before."""
+        with self.lock:
+            return endpoint_key(mirror, url_format) in self.endpoints
+
+    def expected_latency(self, record: Dict[str, Any]) -> float:
+        """Latency divided by the (smoothed) success rate: the expected wait for a usable page."""
+        success_rate = (record["successes"] + 1) / (record["attempts"] + 2)
+        latency = record["latency"] if record["latency"] is not None else DEFAULT_LATENCY
+        return latency / success_rate
+
+    def rank(self, candidates: Iterable[Tuple[str, int, str]]) -> List[Tuple[str, int, str]]:
+        """Order (mirror, url_format, url) candidates best first, leaving out endpoints on cool-down.
+
+        If every endpoint is cooling down, all of them are returned, soonest available first.
+        """
+        now = time.time()
+        available = []
+        cooling = []
+        with self.lock:
+            for candidate in candidates:
+                record = self.endpoints.get(endpoint_key(candidate[0], candidate[1]), new_record())
+                if record["cooldown_until"] > now:
+                    cooling.append((record["cooldown_until"], candidate))
+                else:
+                    available.append(((record["soft_failures_in_row"] > 0, self.expected_latency(record)),
+                                      candidate))
+        if available:
+            available.sort(key=lambda item: item[0])
+            return [candidate for _, candidate in available]
+        cooling.sort(key=lambda item: item[0])
+        return [candidate for _, candidate in cooling]
+
+
+# Global instance for easy access
+_mirror_health = None
+
+def get_mirror_health() -> MirrorHealth:
+    """Get the global mirror health instance."""
+    global _mirror_health
+    if _mirror_health is None:
+        _mirror_health = MirrorHealth()
+    return _mirror_health
@@ -0,0 +1,23 @@
+"""
+Shared SQLite connection helper for the on-disk caches and indexes.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+
+
+@contextmanager
+def connect_sqlite(db_file: str):
+    """Open a short-lived connection that commits on success.
+
+    One connection per call keeps a database usable from any thread; WAL
+    mode lets readers run while another connection writes.
+    """
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()